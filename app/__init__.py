@@ -1,4 +1,4 @@
 from .main import app
 from .database import get_db, engine, Base
-from .routers import auth_router, locations_router,reviews_router,dict_router,pictures_router,users_router
+from .routers import auth_router, locations_router,reviews_router,dict_router,pictures_router,users_router,sync_router
 from .map import models
\ No newline at end of file
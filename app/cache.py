@@ -0,0 +1,196 @@
+"""
+Кэш ответов GET /locations/ по bbox.
+
+bbox расширяется до ячеек geohash (не больше GRID_CELLS штук), так что соседние
+и чуть сдвинутые окна карты попадают в одну запись. В записи лежат уже
+сериализованные локации всей расширенной области; точный bbox, курсор и limit
+применяются при отдаче. Каждая запись помечена своими ячейками: запись
+локации/отзыва/фото сбрасывает только записи, в ячейки которых попала точка.
+
+Хранилище подключаемое (CacheBackend): по умолчанию память процесса,
+для нескольких воркеров можно подставить общее (Redis и т.п.).
+"""
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import geo
+from app.map.models import LocationSeat
+
+# Сколько ячеек сетки максимум на одну запись
+GRID_CELLS = 4
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL = 30.0
+# Больше строк в расширенной области не кэшируем (слишком крупный масштаб)
+MAX_ROWS_PER_ENTRY = 2000
+
+
+class CacheBackend(ABC):
+    """Интерфейс хранилища. Значения - JSON-совместимые структуры, теги - ячейки geohash"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, tags: Iterable[str]):
+        ...
+
+    @abstractmethod
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        """Удалить записи с любым из тегов; вернуть, сколько удалено"""
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+    @abstractmethod
+    def size(self) -> int:
+        ...
+
+
+class MemoryBackend(CacheBackend):
+    """LRU с TTL в памяти процесса (у каждого воркера своё)"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expires_at, tags, value)
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[str, ...], Any]]" = OrderedDict()
+        self._by_tag: Dict[str, Set[str]] = {}
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    async def set(self, key: str, value: Any, tags: Iterable[str]):
+        self._drop(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + self.ttl, tags, value)
+        for tag in tags:
+            self._by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        keys = set()
+        for tag in tags:
+            keys.update(self._by_tag.get(tag, ()))
+        for key in keys:
+            self._drop(key)
+        return len(keys)
+
+    async def clear(self):
+        self._entries.clear()
+        self._by_tag.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class BboxCache:
+    """Привязка bbox к сетке, ключи, счётчики попаданий и сброс по точке"""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        # Выключатель (например, для бенчмарков запросов в БД)
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Растёт при каждом сбросе: результат запроса, начатого до сброса, не сохраняем
+        self.epoch = 0
+
+    def snap(self, min_lat, max_lat, min_lon, max_lon) -> Optional[Tuple[List[str], Tuple[Decimal, ...]]]:
+        """Ячейки и расширенный bbox (min_lat, max_lat, min_lon, max_lon); None - не кэшируем"""
+        if not self.enabled:
+            return None
+        cells = geo.cover(min_lat, max_lat, min_lon, max_lon, max_cells=GRID_CELLS)
+        if not cells:
+            return None
+        precision = len(cells[0])
+        lat_step, lon_step = geo.cell_size(precision)
+        x0, y0 = geo.cell_index(min_lat, min_lon, precision)
+        x1, y1 = geo.cell_index(max_lat, max_lon, precision)
+        bounds = (
+            y0 * lat_step - 90.0,
+            (y1 + 1) * lat_step - 90.0,
+            x0 * lon_step - 180.0,
+            (x1 + 1) * lon_step - 180.0,
+        )
+        return cells, tuple(Decimal(repr(b)) for b in bounds)
+
+    @staticmethod
+    def make_key(cells: List[str], **params) -> str:
+        extra = ",".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"locations:{'|'.join(cells)}:{extra}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def put(self, key: str, value: Any, cells: List[str], epoch: int):
+        if epoch != self.epoch:
+            return
+        await self.backend.set(key, value, cells)
+
+    async def invalidate_point(self, lat, lon):
+        """Сбросить записи всех ячеек (любой точности), в которые попадает точка"""
+        self.epoch += 1
+        full = geo.encode(lat, lon)
+        self.invalidations += await self.backend.invalidate(
+            full[:precision] for precision in range(1, len(full) + 1)
+        )
+
+    async def invalidate_location(self, db: AsyncSession, location_id: int):
+        """То же по id локации (для отзывов и фото)"""
+        result = await db.execute(
+            select(LocationSeat.cord_x, LocationSeat.cord_y).where(LocationSeat.id == location_id)
+        )
+        row = result.one_or_none()
+        if row is not None:
+            await self.invalidate_point(row.cord_x, row.cord_y)
+
+    async def clear(self):
+        self.epoch += 1
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "invalidations": self.invalidations,
+            "entries": self.backend.size(),
+        }
+
+
+bbox_cache = BboxCache(MemoryBackend())
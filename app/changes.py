@@ -0,0 +1,102 @@
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import select, update, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_maker
+from app.map.models import ChangeLog, LocationSeat
+
+# Сущности журнала
+LOCATION = "location"
+REVIEW = "review"
+PICTURE = "picture"
+
+# Операции
+UPSERT = "upsert"
+DELETE = "delete"
+
+# Ключ advisory-блокировки журнала
+CHANGE_LOG_LOCK = 7_310_001
+
+
+async def lock_change_log(db: AsyncSession):
+    """
+    Пишущие в журнал транзакции берут id по очереди и держат блокировку до commit:
+    пока запись с меньшим id не закоммичена, записей с большим id нет, и токен
+    синхронизации (последний отданный id) ничего не пропускает.
+    Блокировку берём последней - после блокировок строк локаций.
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK)))
+
+
+async def bump_location_version(db: AsyncSession, location_id: int):
+    """Счётчик версии локации - основа ETag для локации, её отзывов и фото"""
+    await db.execute(
+        update(LocationSeat)
+        .where(LocationSeat.id == location_id)
+        .values(version=LocationSeat.version + 1)
+    )
+
+
+async def bump_location_versions(db: AsyncSession, location_ids: Iterable[int]):
+    """То же для нескольких локаций одним UPDATE"""
+    location_ids = sorted(set(location_ids))
+    if location_ids:
+        await db.execute(
+            update(LocationSeat)
+            .where(LocationSeat.id.in_(location_ids))
+            .values(version=LocationSeat.version + 1)
+        )
+
+
+async def record_change(
+    db: AsyncSession,
+    entity: str,
+    entity_id: int,
+    operation: str = UPSERT,
+    location_id: Optional[int] = None
+):
+    """
+    Записать изменение в журнал и поднять версию затронутой локации.
+    Пишется в той же транзакции, что и само изменение.
+    """
+    if location_id is not None and not (entity == LOCATION and operation == DELETE):
+        await bump_location_version(db, location_id)
+    await lock_change_log(db)
+    db.add(ChangeLog(
+        entity=entity,
+        entity_id=entity_id,
+        operation=operation,
+        location_id=location_id
+    ))
+
+
+async def record_changes(
+    db: AsyncSession,
+    entity: str,
+    items: Iterable[Tuple[int, Optional[int]]],
+    operation: str = UPSERT
+):
+    """
+    Пачка записей журнала одним INSERT (массовый импорт, пачки отзывов).
+    items - пары (entity_id, location_id); версии локаций поднимает вызывающий, если нужно.
+    """
+    rows = [
+        {"entity": entity, "entity_id": entity_id, "operation": operation, "location_id": location_id}
+        for entity_id, location_id in items
+    ]
+    if rows:
+        await lock_change_log(db)
+        await db.execute(insert(ChangeLog), rows)
+
+
+async def record_change_now(
+    entity: str,
+    entity_id: int,
+    operation: str = UPSERT,
+    location_id: Optional[int] = None
+):
+    """То же самое, но отдельной транзакцией (для админки, где commit уже прошёл)"""
+    async with async_session_maker() as session:
+        await record_change(session, entity, entity_id, operation, location_id)
+        await session.commit()
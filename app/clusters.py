@@ -0,0 +1,150 @@
+import math
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.map.models import LocationSeat
+
+# Дальше этого зума кластеры не считаем - отдаём отдельные точки из базы
+MAX_CLUSTER_ZOOM = 15
+
+# Тайл 256px делим на 8x8 ячеек (~32px на кластер)
+CELL_BITS = 3
+
+# Сколько ячеек максимум отдаём за один запрос
+MAX_CLUSTERS = 2000
+
+MAX_MERCATOR_LAT = 85.05112878
+
+Number = Union[float, Decimal, int]
+
+
+def _cell(lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+    """Ячейка кластера на сетке Web Mercator для зума"""
+    n = 1 << (zoom + CELL_BITS)
+    lat = min(max(lat, -MAX_MERCATOR_LAT), MAX_MERCATOR_LAT)
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+class ClusterIndex:
+    """
+    Предпосчитанные кластеры для каждого зума.
+
+    На каждом зуме ячейка хранит по каждому статусу [count, sum_lat, sum_lon, id_xor].
+    id_xor при count == 1 совпадает с id единственной локации - так одиночные точки
+    отдаются без хранения списков id. Память ~ (число локаций) x (MAX_CLUSTER_ZOOM + 1).
+    Индекс живёт в памяти процесса и обновляется роутерами после commit
+    (изменения из других воркеров догоняет app/index_sync.py).
+    """
+
+    def __init__(self):
+        self._grids: List[Dict[Tuple[int, int], Dict[int, list]]] = [{} for _ in range(MAX_CLUSTER_ZOOM + 1)]
+        self._points: Dict[int, Tuple[float, float, int]] = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def _apply(self, location_id: int, lat: float, lon: float, status: int, sign: int):
+        for zoom, grid in enumerate(self._grids):
+            key = _cell(lat, lon, zoom)
+            cell = grid.setdefault(key, {})
+            stat = cell.get(status)
+            if stat is None:
+                stat = cell[status] = [0, 0.0, 0.0, 0]
+            stat[0] += sign
+            stat[1] += sign * lat
+            stat[2] += sign * lon
+            stat[3] ^= location_id
+            if stat[0] <= 0:
+                del cell[status]
+                if not cell:
+                    del grid[key]
+
+    def add(self, location_id: int, lat: Number, lon: Number, status: int):
+        self.remove(location_id)
+        point = (float(lat), float(lon), status)
+        self._points[location_id] = point
+        self._apply(location_id, *point, sign=1)
+
+    def remove(self, location_id: int):
+        point = self._points.pop(location_id, None)
+        if point is not None:
+            self._apply(location_id, *point, sign=-1)
+
+    def upsert(self, location: LocationSeat):
+        self.add(location.id, location.cord_x, location.cord_y, location.status)
+
+    def clear(self):
+        for grid in self._grids:
+            grid.clear()
+        self._points.clear()
+
+    async def rebuild(self, db: AsyncSession):
+        """Полная пересборка из LocationSeat (при старте приложения)"""
+        self.clear()
+        stmt = select(
+            LocationSeat.id, LocationSeat.cord_x, LocationSeat.cord_y, LocationSeat.status
+        ).execution_options(yield_per=5000)
+        result = await db.stream(stmt)
+        async for row in result:
+            self.add(row.id, row.cord_x, row.cord_y, row.status)
+
+    def effective_zoom(self, min_lat, min_lon, max_lat, max_lon, zoom: int) -> int:
+        """Понижаем зум, пока ячеек в bbox не станет не больше MAX_CLUSTERS"""
+        zoom = min(max(zoom, 0), MAX_CLUSTER_ZOOM)
+        while zoom > 0:
+            x0, y1 = _cell(min_lat, min_lon, zoom)
+            x1, y0 = _cell(max_lat, max_lon, zoom)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= MAX_CLUSTERS:
+                break
+            zoom -= 1
+        return zoom
+
+    def query(
+        self, min_lat: Number, min_lon: Number, max_lat: Number, max_lon: Number,
+        zoom: int, statuses: Optional[Set[int]] = None
+    ) -> List[dict]:
+        """
+        Кластеры в bbox на зуме zoom.
+        statuses - видимые статусы (None - все, для админа).
+        """
+        min_lat, min_lon, max_lat, max_lon = map(float, (min_lat, min_lon, max_lat, max_lon))
+        zoom = self.effective_zoom(min_lat, min_lon, max_lat, max_lon, zoom)
+        grid = self._grids[zoom]
+        x0, y1 = _cell(min_lat, min_lon, zoom)
+        x1, y0 = _cell(max_lat, max_lon, zoom)
+
+        cells = []
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                cell = grid.get((x, y))
+                if not cell:
+                    continue
+                total = [0, 0.0, 0.0, 0]
+                for status, stat in cell.items():
+                    if statuses is not None and status not in statuses:
+                        continue
+                    total[0] += stat[0]
+                    total[1] += stat[1]
+                    total[2] += stat[2]
+                    total[3] ^= stat[3]
+                if total[0]:
+                    cells.append(total)
+
+        clusters = []
+        for count, sum_lat, sum_lon, id_xor in cells:
+            clusters.append({
+                "lat": sum_lat / count,
+                "lon": sum_lon / count,
+                "count": count,
+                "location_id": id_xor if count == 1 else None,
+            })
+        return clusters
+
+
+cluster_index = ClusterIndex()
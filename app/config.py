@@ -11,6 +11,17 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    # Дубликаты при создании локации: радиус поиска и порог похожести названий (0..1)
+    DUPLICATE_RADIUS_M: float = 15.0
+    DUPLICATE_NAME_SIMILARITY: float = 0.6
+    # "Лучшие рядом" (app/ranking.py): априорная оценка и её вес в отзывах,
+    # период полураспада веса отзыва в днях (0 - без затухания), период пересчёта в секундах
+    RANKING_PRIOR_MEAN: float = 3.5
+    RANKING_PRIOR_WEIGHT: float = 5.0
+    RANKING_HALF_LIFE_DAYS: float = 0.0
+    RANKING_REFRESH_SECONDS: float = 3600.0
+    # Как часто воркер догоняет кластеры и подсказки по журналу изменений (app/index_sync.py)
+    INDEX_SYNC_SECONDS: float = 10.0
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env")
     )
@@ -0,0 +1,40 @@
+from typing import Dict, FrozenSet
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.map.models import Pollution, Condition, Material
+from app.registry import TtlRegistry, DEFAULT_TTL
+
+DICT_CACHE_TTL = DEFAULT_TTL
+
+# Поле отзыва -> справочник
+REVIEW_DICTIONARIES = {
+    "pollution_id": Pollution,
+    "condition_id": Condition,
+    "material_id": Material,
+}
+
+
+async def _load_ids(db: AsyncSession) -> Dict[str, FrozenSet[int]]:
+    ids = {}
+    for field, model in REVIEW_DICTIONARIES.items():
+        result = await db.execute(select(model.id))
+        ids[field] = frozenset(result.scalars().all())
+    return ids
+
+
+class ReviewDictionaries(TtlRegistry[Dict[str, FrozenSet[int]]]):
+    """
+    id справочников отзыва (загрязнение, состояние, материал) в памяти процесса.
+    Пачка отзывов проверяется по ним без запросов и без ошибок FK посреди INSERT.
+    """
+
+    def __init__(self, ttl: float = DICT_CACHE_TTL):
+        super().__init__(_load_ids, ttl)
+
+    async def ids(self, db: AsyncSession) -> Dict[str, FrozenSet[int]]:
+        return await self.get(db)
+
+
+review_dictionaries = ReviewDictionaries()
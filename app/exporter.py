@@ -0,0 +1,96 @@
+"""
+Потоковая выгрузка локаций в GeoJSON и CSV (GET /locations/export).
+
+Строки читаются серверным курсором (app/streaming.py) и сразу уходят клиенту,
+поэтому память не зависит от размера таблицы. Тип и статус выгружаются
+названиями - такой файл можно загрузить обратно через импорт.
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+from typing import AsyncIterator, List
+
+from sqlalchemy import select, func
+
+from app.map.models import LocationSeat, LocationRating, TypeOfSeat, Status
+from app.streaming import stream_partitions
+
+FORMATS = ("geojson", "csv")
+MEDIA_TYPES = {"geojson": "application/geo+json", "csv": "text/csv; charset=utf-8"}
+
+BASE_COLUMNS = ["id", "name", "description", "address", "lat", "lon", "type", "status", "author_id"]
+RATING_COLUMNS = ["review_count", "avg_rate", "avg_seating_positions"]
+
+
+def export_query(with_ratings: bool = False):
+    """Только колонки выгрузки, без ORM-объектов; фильтры добавляет роутер"""
+    columns = [
+        LocationSeat.id,
+        LocationSeat.name,
+        LocationSeat.description,
+        LocationSeat.address,
+        LocationSeat.cord_x.label("lat"),
+        LocationSeat.cord_y.label("lon"),
+        TypeOfSeat.name.label("type"),
+        Status.name.label("status"),
+        LocationSeat.author_id,
+    ]
+    if with_ratings:
+        count = func.nullif(LocationRating.review_count, 0)
+        columns += [
+            func.coalesce(LocationRating.review_count, 0).label("review_count"),
+            func.round(LocationRating.rating_sum / count, 2).label("avg_rate"),
+            func.round(LocationRating.seating_sum / count, 2).label("avg_seating_positions"),
+        ]
+    query = (
+        select(*columns)
+        .join(TypeOfSeat, TypeOfSeat.id == LocationSeat.type)
+        .join(Status, Status.id == LocationSeat.status)
+    )
+    if with_ratings:
+        query = query.outerjoin(LocationRating, LocationRating.location_id == LocationSeat.id)
+    return query.order_by(LocationSeat.id)
+
+
+def columns_for(with_ratings: bool) -> List[str]:
+    return BASE_COLUMNS + (RATING_COLUMNS if with_ratings else [])
+
+
+def _json_value(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+async def geojson_rows(query, with_ratings: bool = False) -> AsyncIterator[bytes]:
+    """FeatureCollection по кускам: заголовок, Feature пачками, хвост"""
+    properties = [c for c in columns_for(with_ratings) if c not in ("lat", "lon")]
+    yield b'{"type":"FeatureCollection","features":['
+    first = True
+    async for partition in stream_partitions(query, scalars=False):
+        features = [
+            json.dumps({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [float(row["lon"]), float(row["lat"])]},
+                "properties": {name: _json_value(row[name]) for name in properties},
+            }, ensure_ascii=False, separators=(",", ":"))
+            for row in partition
+        ]
+        if features:
+            yield (("" if first else ",") + ",".join(features)).encode()
+            first = False
+    yield b"]}"
+
+
+async def csv_rows(query, with_ratings: bool = False) -> AsyncIterator[bytes]:
+    """CSV с заголовком; BOM - чтобы Excel сразу открыл кириллицу"""
+    columns = columns_for(with_ratings)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield ("\ufeff" + buffer.getvalue()).encode()
+
+    async for partition in stream_partitions(query, scalars=False):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([row[name] for name in columns] for row in partition)
+        yield buffer.getvalue().encode()
@@ -0,0 +1,210 @@
+"""
+Выборочные поля и связи в ответах с локациями: ?fields=id,name,cord_x,cord_y&expand=reviews
+
+Без параметров ответ прежний (LocationSeatResponse целиком). С параметрами
+запрашиваются только нужные колонки (load_only), а не попавшие в expand связи
+вообще не грузятся; ответ сериализуется урезанной моделью.
+
+?reviews_limit=N встраивает только N последних отзывов каждой локации: они
+выбираются одним оконным запросом (ROW_NUMBER по локации), а имя локации
+в отзыве берётся у родителя, без отдельной подгрузки.
+"""
+from functools import lru_cache
+from collections import defaultdict
+from typing import FrozenSet, List, Optional, Tuple
+
+from fastapi import HTTPException, Query
+from fastapi.responses import Response
+from pydantic import ConfigDict, TypeAdapter, create_model
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, load_only, noload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.etags import make_etag
+from app.map.models import LocationSeat, Review
+from app.pyd.schemas import LocationSeatResponse
+
+# Поля, которые можно выбрать через fields (id отдаётся всегда)
+LOCATION_FIELDS = (
+    "id", "name", "description", "address", "type", "status", "cord_x", "cord_y", "author_id",
+    "rating", "review_count"
+)
+# Берутся из Location_ratings, а не из колонок локации
+RATING_FIELDS = ("rating", "review_count")
+# Связи, которые можно подгрузить через expand
+EXPANDABLE = ("reviews", "pictures")
+MAX_REVIEWS_LIMIT = 50
+
+
+class LocationView:
+    """Что именно отдать: поля (None - все) и подгружаемые связи"""
+
+    def __init__(
+        self,
+        fields: Optional[Tuple[str, ...]] = None,
+        expand: FrozenSet[str] = frozenset(EXPANDABLE),
+        reviews_limit: Optional[int] = None,
+    ):
+        self.fields = fields
+        self.expand = expand
+        self.reviews_limit = reviews_limit if "reviews" in expand else None
+
+    @property
+    def is_default(self) -> bool:
+        return self.fields is None and self.expand == frozenset(EXPANDABLE) and self.reviews_limit is None
+
+    @property
+    def key(self) -> str:
+        """Для ETag: разные представления одной выборки - разные ответы"""
+        fields = ",".join(self.fields) if self.fields is not None else "*"
+        return f"{fields}|{','.join(sorted(self.expand))}|{self.reviews_limit or ''}"
+
+    def etag(self, *parts) -> str:
+        return make_etag(*parts) if self.is_default else make_etag(*parts, self.key)
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        return tuple(f for f in (self.fields or LOCATION_FIELDS) if f not in RATING_FIELDS)
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        """Поля ответа в порядке LocationSeatResponse"""
+        names = self.fields if self.fields is not None else LOCATION_FIELDS
+        return tuple(names) + tuple(e for e in EXPANDABLE if e in self.expand)
+
+    def options(self) -> list:
+        """Опции загрузки для select(LocationSeat)"""
+        options = []
+        if self.fields is not None:
+            options.append(load_only(*(getattr(LocationSeat, c) for c in self.columns)))
+        if any(f in (self.fields or LOCATION_FIELDS) for f in RATING_FIELDS):
+            options.append(selectinload(LocationSeat.rating))
+        if self.reviews_limit:
+            # Отзывы подставит attach() одним оконным запросом
+            options.append(noload(LocationSeat.reviews))
+        elif "reviews" in self.expand:
+            options.append(selectinload(LocationSeat.reviews).options(
+                selectinload(Review.author),
+                selectinload(Review.location)
+            ))
+        if "pictures" in self.expand:
+            options.append(selectinload(LocationSeat.pictures))
+        if self.is_default:
+            options.append(selectinload(LocationSeat.status_ref))
+        return options
+
+    async def attach(self, db: AsyncSession, locations):
+        """Дозагрузка после основного запроса (последние отзывы при reviews_limit)"""
+        if self.reviews_limit and locations:
+            await attach_latest_reviews(db, locations, self.reviews_limit)
+        return locations
+
+    @property
+    def model(self):
+        return _view_model(self.names)
+
+    def project(self, data: dict) -> dict:
+        """Урезать уже сериализованную полную локацию (записи кэша окон карты)"""
+        if self.is_default:
+            return data
+        data = {name: data[name] for name in self.names}
+        if self.reviews_limit:
+            latest = sorted(data["reviews"], key=lambda r: (r["created_at"], r["id"]), reverse=True)
+            data["reviews"] = latest[:self.reviews_limit]
+        return data
+
+    def render(self, locations, headers: Optional[dict] = None) -> Response:
+        """Сериализация списка урезанной моделью (минуя response_model эндпоинта)"""
+        adapter = _list_adapter(self.names)
+        body = adapter.dump_json(adapter.validate_python(locations, from_attributes=True))
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def render_one(self, location, headers: Optional[dict] = None) -> Response:
+        body = self.model.model_validate(location).model_dump_json()
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+@lru_cache(maxsize=256)
+def _view_model(names: Tuple[str, ...]):
+    source = LocationSeatResponse.model_fields
+    return create_model(
+        "LocationSeatView",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (source[name].annotation, source[name]) for name in names}
+    )
+
+
+@lru_cache(maxsize=256)
+def _list_adapter(names: Tuple[str, ...]) -> TypeAdapter:
+    return TypeAdapter(List[_view_model(names)])
+
+
+async def attach_latest_reviews(db: AsyncSession, locations, limit: int):
+    """
+    N последних отзывов каждой локации одним запросом:
+    ROW_NUMBER() OVER (PARTITION BY location_id ORDER BY created_at DESC, id DESC) <= N.
+    Локация отзыва - уже загруженный родитель, отдельно не грузится.
+    """
+    by_id = {location.id: location for location in locations}
+    position = func.row_number().over(
+        partition_by=Review.location_id,
+        order_by=(Review.created_at.desc(), Review.id.desc())
+    ).label("position")
+    ranked = (
+        select(Review.id, position)
+        .where(Review.location_id.in_(by_id))
+        .subquery()
+    )
+    stmt = (
+        select(Review)
+        .join(ranked, ranked.c.id == Review.id)
+        .where(ranked.c.position <= limit)
+        .options(selectinload(Review.author))
+        .order_by(Review.location_id, ranked.c.position)
+    )
+    result = await db.execute(stmt)
+
+    reviews = defaultdict(list)
+    for review in result.scalars().all():
+        set_committed_value(review, "location", by_id[review.location_id])
+        reviews[review.location_id].append(review)
+    for location_id, location in by_id.items():
+        set_committed_value(location, "reviews", reviews[location_id])
+
+
+def _split(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def location_view(
+    fields: Optional[str] = Query(None, description=f"Поля через запятую: {', '.join(LOCATION_FIELDS)}"),
+    expand: Optional[str] = Query(None, description="Связи через запятую: reviews, pictures (пусто - без связей)"),
+    reviews_limit: Optional[int] = Query(
+        None, ge=1, le=MAX_REVIEWS_LIMIT, description="Встроить только N последних отзывов (всего - в review_count)"
+    ),
+) -> LocationView:
+    """Зависимость для эндпоинтов локаций"""
+    view_fields = None
+    if fields is not None:
+        requested = _split(fields)
+        unknown = [f for f in requested if f not in LOCATION_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Неизвестные поля: {', '.join(unknown)}")
+        view_fields = tuple(f for f in LOCATION_FIELDS if f == "id" or f in requested)
+
+    view_expand = frozenset(EXPANDABLE)
+    if expand is not None:
+        requested = _split(expand)
+        unknown = [e for e in requested if e not in EXPANDABLE]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Нельзя раскрыть: {', '.join(unknown)}")
+        view_expand = frozenset(requested)
+    elif view_fields is not None:
+        # Выбрали поля, но не связи - связи не нужны
+        view_expand = frozenset()
+
+    return LocationView(view_fields, view_expand, reviews_limit)
+
+
+DEFAULT_VIEW = LocationView()
@@ -0,0 +1,204 @@
+import math
+from decimal import Decimal
+from typing import List, Tuple, Union
+
+from sqlalchemy import and_, or_, func
+
+# Алфавит geohash (без a, i, l, o)
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {c: i for i, c in enumerate(BASE32)}
+
+# Точность ячейки, которая хранится в LocationSeat.geohash
+GEOHASH_PRECISION = 12
+
+# Сколько ячеек максимум даём планировщику на один bbox
+MAX_COVER_CELLS = 32
+
+Number = Union[float, Decimal, int]
+
+
+def _bits(precision: int) -> Tuple[int, int]:
+    """Количество бит долготы и широты для заданной точности"""
+    total = precision * 5
+    return (total + 1) // 2, total // 2
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Размер ячейки в градусах: (широта, долгота)"""
+    lon_bits, lat_bits = _bits(precision)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def cell_index(lat: Number, lon: Number, precision: int) -> Tuple[int, int]:
+    """Номер ячейки (колонка по долготе, строка по широте) на сетке точности precision"""
+    lon_bits, lat_bits = _bits(precision)
+    ix = int((float(lon) + 180.0) / 360.0 * (1 << lon_bits))
+    iy = int((float(lat) + 90.0) / 180.0 * (1 << lat_bits))
+    return min(max(ix, 0), (1 << lon_bits) - 1), min(max(iy, 0), (1 << lat_bits) - 1)
+
+
+def cell_from_index(ix: int, iy: int, precision: int) -> str:
+    """Собрать geohash из номеров ячейки (биты чередуются, начиная с долготы)"""
+    lon_bits, lat_bits = _bits(precision)
+    value = 0
+    lon_pos, lat_pos = lon_bits - 1, lat_bits - 1
+    for i in range(precision * 5):
+        if i % 2 == 0:
+            value = (value << 1) | ((ix >> lon_pos) & 1)
+            lon_pos -= 1
+        else:
+            value = (value << 1) | ((iy >> lat_pos) & 1)
+            lat_pos -= 1
+
+    chars = []
+    for _ in range(precision):
+        chars.append(BASE32[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def encode(lat: Number, lon: Number, precision: int = GEOHASH_PRECISION) -> str:
+    ix, iy = cell_index(lat, lon, precision)
+    return cell_from_index(ix, iy, precision)
+
+
+def _to_int(cell: str) -> int:
+    value = 0
+    for c in cell:
+        value = (value << 5) | _BASE32_INDEX[c]
+    return value
+
+
+def cover(
+    min_lat: Number, max_lat: Number, min_lon: Number, max_lon: Number,
+    max_cells: int = MAX_COVER_CELLS
+) -> List[str]:
+    """
+    Набор ячеек, покрывающих bbox.
+    Берём самую мелкую точность, при которой ячеек не больше max_cells.
+    """
+    cells: List[str] = []
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        x0, y0 = cell_index(min_lat, min_lon, precision)
+        x1, y1 = cell_index(max_lat, max_lon, precision)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > max_cells:
+            break
+        cells = [
+            cell_from_index(ix, iy, precision)
+            for ix in range(x0, x1 + 1)
+            for iy in range(y0, y1 + 1)
+        ]
+    # Даже одна ячейка первой точности шире bbox - тогда ищем по всему миру
+    return sorted(cells)
+
+
+def cell_ranges(cells: List[str]) -> List[Tuple[str, str]]:
+    """Склеиваем соседние (по порядку geohash) ячейки в диапазоны (от, до)"""
+    ranges: List[Tuple[str, str]] = []
+    prev_value = None
+    for cell in sorted(cells):
+        value = _to_int(cell)
+        if ranges and prev_value is not None and value == prev_value + 1 and len(cell) == len(ranges[-1][1]):
+            ranges[-1] = (ranges[-1][0], cell)
+        else:
+            ranges.append((cell, cell))
+        prev_value = value
+    return ranges
+
+
+def ranges_clause(column, ranges: List[Tuple[str, str]]):
+    """
+    Условие по индексу geohash: column попадает хотя бы в один диапазон префиксов.
+    '~' больше любого символа алфавита geohash (колонка с collation "C").
+    """
+    return or_(*[and_(column >= lo, column < hi + "~") for lo, hi in ranges])
+
+
+def bbox_clause(column, min_lat: Number, max_lat: Number, min_lon: Number, max_lon: Number):
+    """Грубый фильтр по ячейкам для bbox. Точный фильтр по координатам всё равно нужен."""
+    cells = cover(min_lat, max_lat, min_lon, max_lon)
+    if not cells:
+        return column.isnot(None)
+    return ranges_clause(column, cell_ranges(cells))
+
+
+# --- Расстояния и поиск по кольцам ---
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180.0
+
+# Самая мелкая сетка для поиска "рядом" (~38 x 19 м)
+NEARBY_MAX_PRECISION = 8
+
+
+def haversine_m(lat1: Number, lon1: Number, lat2: Number, lon2: Number) -> float:
+    """Расстояние по большому кругу в метрах"""
+    lat1, lon1, lat2, lon2 = map(math.radians, map(float, (lat1, lon1, lat2, lon2)))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_sql(lat_column, lon_column, lat: Number, lon: Number):
+    """То же расстояние выражением SQL (для фильтра по радиусу в запросе)"""
+    lat, lon = math.radians(float(lat)), math.radians(float(lon))
+    dlat = func.radians(lat_column) - lat
+    dlon = func.radians(lon_column) - lon
+    a = (func.power(func.sin(dlat / 2), 2)
+         + math.cos(lat) * func.cos(func.radians(lat_column)) * func.power(func.sin(dlon / 2), 2))
+    return 2 * EARTH_RADIUS_M * func.asin(func.least(1.0, func.sqrt(a)))
+
+
+def radius_bbox(lat: Number, lon: Number, radius_m: float) -> Tuple[float, float, float, float]:
+    """bbox (min_lat, max_lat, min_lon, max_lon), описанный вокруг круга"""
+    lat, lon = float(lat), float(lon)
+    dlat = radius_m / METERS_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(min(abs(lat), 89.0))), 1e-6)
+    dlon = min(radius_m / (METERS_PER_DEGREE * cos_lat), 180.0)
+    return max(lat - dlat, -90.0), min(lat + dlat, 90.0), max(lon - dlon, -180.0), min(lon + dlon, 180.0)
+
+
+def min_cell_m(precision: int, lat: Number) -> float:
+    """Меньшая сторона ячейки в метрах на широте lat"""
+    lat_deg, lon_deg = cell_size(precision)
+    cos_lat = max(math.cos(math.radians(min(abs(float(lat)), 89.0))), 1e-6)
+    return min(lat_deg * METERS_PER_DEGREE, lon_deg * METERS_PER_DEGREE * cos_lat)
+
+
+def precision_for_radius(radius_m: float, lat: Number, max_rings: int = 8) -> int:
+    """Самая мелкая сетка, на которой радиус покрывается не более чем max_rings кольцами"""
+    for precision in range(NEARBY_MAX_PRECISION, 0, -1):
+        if min_cell_m(precision, lat) * max_rings >= radius_m:
+            return precision
+    return 1
+
+
+def ring_cells(lat: Number, lon: Number, precision: int, ring: int) -> List[str]:
+    """Ячейки кольца номер ring вокруг ячейки точки (0 - сама ячейка)"""
+    lon_bits, lat_bits = _bits(precision)
+    ix, iy = cell_index(lat, lon, precision)
+    if ring == 0:
+        return [cell_from_index(ix, iy, precision)]
+
+    offsets = set()
+    for d in range(-ring, ring + 1):
+        offsets.update({(d, -ring), (d, ring), (-ring, d), (ring, d)})
+
+    cells = set()
+    for dx, dy in offsets:
+        y = iy + dy
+        if 0 <= y < (1 << lat_bits):
+            # По долготе сетка замкнута
+            cells.add(cell_from_index((ix + dx) % (1 << lon_bits), y, precision))
+    return sorted(cells)
+
+
+def ring_radius_m(lat: Number, precision: int, ring: int) -> float:
+    """Радиус, который гарантированно просмотрен после колец 0..ring"""
+    return ring * min_cell_m(precision, lat)
+
+
+def neighbourhood_cells(lat: Number, lon: Number, radius_m: float) -> List[str]:
+    """Ячейка точки и её соседи на сетке, где ячейка не меньше радиуса: круг покрыт целиком"""
+    precision = precision_for_radius(radius_m, lat, max_rings=1)
+    return ring_cells(lat, lon, precision, 0) + ring_cells(lat, lon, precision, 1)
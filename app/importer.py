@@ -0,0 +1,305 @@
+"""
+Массовый импорт локаций из CSV и GeoJSON (эндпоинт POST /locations/import и import_locations.py).
+
+Файл читается потоком: CSV построчно, GeoJSON по одному Feature через raw_decode,
+так что в памяти держится только текущая пачка. Пачка проверяется схемой,
+дубликаты по координатам (в файле и в базе) пропускаются, остальное
+вставляется одним многострочным INSERT вместе с записями журнала изменений.
+
+CSV: заголовок name, description, address, lat (cord_x), lon (cord_y), type, status.
+GeoJSON: FeatureCollection из Point, поля - в properties.
+type и status - id или название из справочника.
+"""
+import csv
+import json
+import re
+import time
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import geo, changes
+from app.cache import bbox_cache
+from app.clusters import cluster_index
+from app.suggest import suggest_index
+from app.map.models import LocationSeat, TypeOfSeat, Status
+from app.pyd.schemas import LocationImportRow
+
+FORMATS = ("csv", "geojson")
+
+IMPORT_BATCH = 1000
+CHUNK_SIZE = 64 * 1024
+# Больше ошибок в отчёт не кладём (счётчик при этом считает все)
+MAX_REPORTED_ERRORS = 1000
+
+# Точность колонок координат в БД - DECIMAL(20, 15)
+COORD_QUANT = Decimal("1e-15")
+
+_FEATURES_RE = re.compile(r'"features"\s*:\s*\[')
+
+# Синонимы колонок CSV и свойств GeoJSON
+_ALIASES = {
+    "cord_x": ("cord_x", "lat", "latitude"),
+    "cord_y": ("cord_y", "lon", "lng", "longitude"),
+}
+
+
+class ImportFormatError(ValueError):
+    """Файл не разбирается как CSV/GeoJSON"""
+
+
+def detect_format(filename: Optional[str]) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".geojson", ".json")):
+        return "geojson"
+    if name.endswith(".csv"):
+        return "csv"
+    raise ImportFormatError("Не удалось определить формат файла, укажите format=csv или format=geojson")
+
+
+def _normalize(raw: dict) -> dict:
+    data = {k.strip().lower(): v for k, v in raw.items() if k is not None}
+    for field, aliases in _ALIASES.items():
+        for alias in aliases:
+            if data.get(alias) not in (None, ""):
+                data[field] = data[alias]
+                break
+    return data
+
+
+def iter_csv(fp: TextIO) -> Iterator[Tuple[int, dict]]:
+    reader = csv.DictReader(fp)
+    for number, row in enumerate(reader, start=1):
+        yield number, _normalize(row)
+
+
+def iter_geojson(fp: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, dict]]:
+    """Feature за Feature из FeatureCollection, не читая файл целиком"""
+    decoder = json.JSONDecoder(parse_float=Decimal)
+    buf, eof = "", False
+
+    # Ищем начало массива features
+    while True:
+        chunk = fp.read(chunk_size)
+        eof = not chunk
+        buf += chunk
+        match = _FEATURES_RE.search(buf)
+        if match:
+            buf = buf[match.end():]
+            break
+        if eof:
+            raise ImportFormatError("В GeoJSON нет массива features")
+        buf = buf[-64:]
+
+    number = 0
+    while True:
+        buf = buf.lstrip(" \t\r\n,")
+        if buf.startswith("]"):
+            return
+        try:
+            feature, end = decoder.raw_decode(buf)
+        except ValueError:
+            if eof:
+                raise ImportFormatError(f"GeoJSON обрывается после объекта {number}")
+            chunk = fp.read(chunk_size)
+            eof = not chunk
+            buf += chunk
+            continue
+        buf = buf[end:]
+        number += 1
+        yield number, _feature_row(feature)
+
+
+def _feature_row(feature) -> dict:
+    if not isinstance(feature, dict):
+        return {"_error": "Ожидался объект Feature"}
+    geometry = feature.get("geometry") or {}
+    coordinates = geometry.get("coordinates")
+    if geometry.get("type") != "Point" or not isinstance(coordinates, list) or len(coordinates) < 2:
+        return {"_error": "Поддерживается только geometry типа Point"}
+    row = _normalize(feature.get("properties") or {})
+    # В GeoJSON порядок [долгота, широта]
+    row["cord_y"], row["cord_x"] = coordinates[0], coordinates[1]
+    return row
+
+
+def read_records(fp: TextIO, fmt: str) -> Iterator[Tuple[int, dict]]:
+    if fmt == "csv":
+        return iter_csv(fp)
+    if fmt == "geojson":
+        return iter_geojson(fp)
+    raise ImportFormatError(f"Неизвестный формат: {fmt}")
+
+
+def _error_text(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+
+class LocationImporter:
+    """Проверка, дедупликация и вставка пачками; итог - отчёт с ошибками по строкам"""
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        author_id: int,
+        default_status: Optional[str] = None,
+        batch_size: int = IMPORT_BATCH,
+    ):
+        self.db = db
+        self.author_id = author_id
+        self.default_status = default_status
+        self.batch_size = batch_size
+
+        self._types: Dict[str, int] = {}
+        self._statuses: Dict[str, int] = {}
+        self._seen = set()
+
+        self.total = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    async def _load_dictionaries(self):
+        for model, target in ((TypeOfSeat, self._types), (Status, self._statuses)):
+            rows = (await self.db.execute(select(model.id, model.name))).all()
+            for row in rows:
+                target[str(row.id)] = row.id
+                target[row.name.strip().lower()] = row.id
+
+    def _error(self, number: int, message: str):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": number, "error": message})
+
+    def _resolve(self, value, dictionary: Dict[str, int], title: str) -> int:
+        if value in (None, ""):
+            raise ValueError(f"{title}: не указан")
+        key = str(value).strip().lower()
+        if key not in dictionary:
+            raise ValueError(f"{title}: нет такого значения в справочнике ({value})")
+        return dictionary[key]
+
+    def _validate(self, raw: dict) -> LocationImportRow:
+        if "_error" in raw:
+            raise ValueError(raw["_error"])
+        if raw.get("status") in (None, "") and self.default_status is not None:
+            raw["status"] = self.default_status
+        raw["type"] = self._resolve(raw.get("type"), self._types, "type")
+        raw["status"] = self._resolve(raw.get("status"), self._statuses, "status")
+        for field in ("description", "address"):
+            if raw.get(field) in (None, ""):
+                raw.pop(field, None)
+        try:
+            return LocationImportRow.model_validate(raw)
+        except ValidationError as e:
+            raise ValueError(_error_text(e))
+
+    async def _flush(self, batch: List[Tuple[int, LocationImportRow]]):
+        if not batch:
+            return
+
+        # Дубликаты по точным координатам: сначала внутри файла, потом в базе
+        # (одинаковые координаты дают одинаковый geohash - ищем по индексу)
+        points = {}
+        for number, row in batch:
+            point = (row.cord_x.quantize(COORD_QUANT), row.cord_y.quantize(COORD_QUANT))
+            if point in self._seen:
+                self.duplicates += 1
+                self._error(number, "Дубликат: такие координаты уже есть в файле")
+                continue
+            self._seen.add(point)
+            points[number] = (point, geo.encode(*point))
+
+        existing = set()
+        if points:
+            result = await self.db.execute(
+                select(LocationSeat.cord_x, LocationSeat.cord_y)
+                .where(LocationSeat.geohash.in_({cell for _, cell in points.values()}))
+            )
+            existing = {(x.quantize(COORD_QUANT), y.quantize(COORD_QUANT)) for x, y in result.all()}
+
+        rows = []
+        for number, row in batch:
+            if number not in points:
+                continue
+            point, cell = points[number]
+            if point in existing:
+                self.duplicates += 1
+                self._error(number, "Дубликат: локация с такими координатами уже есть")
+                continue
+            rows.append({
+                **row.model_dump(),
+                "author_id": self.author_id,
+                # Массовая вставка обходит ORM-события, geohash считаем сами
+                "geohash": cell,
+            })
+
+        if not rows:
+            return
+        result = await self.db.execute(
+            insert(LocationSeat).returning(
+                LocationSeat.id, LocationSeat.name, LocationSeat.address,
+                LocationSeat.cord_x, LocationSeat.cord_y, LocationSeat.status
+            ),
+            rows
+        )
+        created = result.all()
+        await changes.record_changes(self.db, changes.LOCATION, [(r.id, r.id) for r in created])
+        await self.db.commit()
+
+        for r in created:
+            cluster_index.add(r.id, r.cord_x, r.cord_y, r.status)
+            suggest_index.add(r.id, r.name, r.address, r.status)
+        self.inserted += len(created)
+
+    def _read_batch(self, records: Iterator[Tuple[int, dict]]) -> Tuple[List[Tuple[int, LocationImportRow]], bool]:
+        """Следующая пачка проверенных строк и признак конца файла"""
+        batch: List[Tuple[int, LocationImportRow]] = []
+        for number, raw in records:
+            self.total += 1
+            try:
+                batch.append((number, self._validate(raw)))
+            except ValueError as e:
+                self.failed += 1
+                self._error(number, str(e))
+            if len(batch) >= self.batch_size:
+                return batch, False
+        return batch, True
+
+    async def run(self, records: Iterable[Tuple[int, dict]]) -> dict:
+        started = time.perf_counter()
+        aborted = None
+        await self._load_dictionaries()
+
+        records = iter(records)
+        try:
+            done = False
+            while not done:
+                # Чтение файла и проверка строк синхронные - в пуле потоков, чтобы не держать цикл событий
+                batch, done = await run_in_threadpool(self._read_batch, records)
+                await self._flush(batch)
+        except (ImportFormatError, csv.Error, UnicodeDecodeError) as e:
+            # Уже вставленные пачки остаются, в отчёте - где остановились
+            await self.db.rollback()
+            aborted = str(e)
+
+        if self.inserted:
+            await bbox_cache.clear()
+
+        seconds = time.perf_counter() - started
+        return {
+            "total": self.total,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "errors": self.errors,
+            "aborted": aborted,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(self.total / seconds, 1) if seconds else 0.0,
+        }
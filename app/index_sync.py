@@ -0,0 +1,78 @@
+"""
+Догоняем индексы в памяти процесса (кластеры карты, подсказки поиска) по журналу изменений.
+
+Роутеры обновляют индексы своего воркера сразу после commit, но записи других
+воркеров, импорта и админки сюда не попадают. Поэтому каждый воркер раз в
+INDEX_SYNC_SECONDS читает из Change_log локации, изменённые после его отметки
+(id последней учтённой записи), и перечитывает только их. Id журнала выдаются
+в порядке commit (changes.lock_change_log), так что по отметке ничего не теряется.
+Записи в базу мимо журнала (ручной SQL, seed.py) видны только после перезапуска.
+"""
+import asyncio
+from typing import Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import changes
+from app.clusters import cluster_index
+from app.config import settings
+from app.database import async_session_maker
+from app.map.models import ChangeLog, LocationSeat
+from app.suggest import suggest_index
+
+# Сколько локаций перечитываем одним запросом
+SYNC_BATCH = 5000
+
+
+async def high_water_mark(db: AsyncSession) -> int:
+    """id последней записи журнала (0 - журнал пуст)"""
+    return await db.scalar(select(func.coalesce(func.max(ChangeLog.id), 0)))
+
+
+async def apply_changes(db: AsyncSession, since: int) -> int:
+    """Перечитать локации, изменённые после since; вернуть новую отметку"""
+    mark = await high_water_mark(db)
+    if mark <= since:
+        return since
+
+    result = await db.execute(
+        select(ChangeLog.entity_id)
+        .where(ChangeLog.id > since, ChangeLog.id <= mark, ChangeLog.entity == changes.LOCATION)
+        .distinct()
+    )
+    location_ids = sorted(result.scalars().all())
+
+    for start in range(0, len(location_ids), SYNC_BATCH):
+        batch = location_ids[start:start + SYNC_BATCH]
+        result = await db.execute(
+            select(
+                LocationSeat.id, LocationSeat.cord_x, LocationSeat.cord_y,
+                LocationSeat.status, LocationSeat.name, LocationSeat.address
+            )
+            .where(LocationSeat.id.in_(batch))
+        )
+        found = set()
+        for row in result.all():
+            cluster_index.upsert(row)
+            suggest_index.upsert(row)
+            found.add(row.id)
+        # Нет в базе - удалена
+        for location_id in set(batch) - found:
+            cluster_index.remove(location_id)
+            suggest_index.remove(location_id)
+    return mark
+
+
+async def run_periodic(since: int, interval: Optional[float] = None):
+    """Фоновая задача из lifespan; since - отметка, снятая перед начальной сборкой индексов"""
+    interval = interval or settings.INDEX_SYNC_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with async_session_maker() as session:
+                since = await apply_changes(session, since)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Не удалось обновить кластеры и подсказки: {e}")
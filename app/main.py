@@ -1,9 +1,20 @@
 from fastapi import FastAPI
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from typing import Union
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine
+from app.database import engine, async_session_maker
+from app.clusters import cluster_index
+from app.statuses import status_registry
+from app.dicts import review_dictionaries
+from app.cache import bbox_cache
+from app.suggest import suggest_index
+from app import changes
+from app import ranking
+from app import ratings
+from app import index_sync
 
 from starlette.middleware.sessions import SessionMiddleware
 from app.admin_auth import authentication_backend # <--- Импортируем нашу логику
@@ -22,11 +33,30 @@ from app.routers import (
     reviews_router,
     dict_router,
     pictures_router,
-    users_router
+    users_router,
+    sync_router
 )
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Строим кластеры карты один раз при старте, дальше они обновляются роутерами
+    async with async_session_maker() as session:
+        await status_registry.load(session)
+        # Отметка журнала до сборки: всё, что запишут во время неё, догонит index_sync
+        mark = await index_sync.high_water_mark(session)
+        await cluster_index.rebuild(session)
+        await suggest_index.rebuild(session)
+    # Пересчёт score "лучших рядом" (сразу и дальше периодически)
+    refresher = asyncio.create_task(ranking.run_periodic())
+    # Изменения локаций из других воркеров, импорта и админки
+    index_syncer = asyncio.create_task(index_sync.run_periodic(mark))
+    yield
+    refresher.cancel()
+    index_syncer.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Включите CORS для Android
 app.add_middleware(
@@ -34,6 +64,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 os.makedirs("uploads", exist_ok=True)
 app.mount("/static", StaticFiles(directory="uploads"), name="static")
@@ -46,6 +77,7 @@ app.include_router(reviews_router,)
 app.include_router(dict_router,)
 app.include_router(pictures_router,)
 app.include_router(users_router,)
+app.include_router(sync_router,)
 
 admin = Admin(
     app, 
@@ -82,6 +114,26 @@ class LocationSeatAdmin(ModelView, model=LocationSeat):
     ]
     column_searchable_list = [LocationSeat.name, LocationSeat.address]
     column_sortable_list = [LocationSeat.id, LocationSeat.created_at] 
+    # Служебные колонки заполняются сами
+    form_excluded_columns = [LocationSeat.geohash, LocationSeat.version, LocationSeat.search_vector]
+
+    # Правки из админки тоже должны попадать в кластеры карты
+    async def after_model_change(self, data, model, is_created, request):
+        if not is_created:
+            # Координаты могли поменять - переносим локацию в её ячейку рейтинга
+            async with async_session_maker() as session:
+                await ranking.update_cell(session, model.id, model.cord_x, model.cord_y)
+                await session.commit()
+        cluster_index.upsert(model)
+        suggest_index.upsert(model)
+        await bbox_cache.invalidate_point(model.cord_x, model.cord_y)
+        await changes.record_change_now(changes.LOCATION, model.id, location_id=model.id)
+
+    async def after_model_delete(self, model, request):
+        cluster_index.remove(model.id)
+        suggest_index.remove(model.id)
+        await bbox_cache.invalidate_point(model.cord_x, model.cord_y)
+        await changes.record_change_now(changes.LOCATION, model.id, changes.DELETE, location_id=model.id)
 
 # 4. Отзывы
 class ReviewAdmin(ModelView, model=Review):
@@ -93,10 +145,36 @@ class ReviewAdmin(ModelView, model=Review):
         Review.rate, 
         Review.author, 
         Review.created_at, 
-        Review.pollution_ref 
+        Review.pollution_ref,
+        Review.location
     ]
     column_sortable_list = [Review.created_at, Review.rate]
 
+    # Агрегаты (Location_ratings, распределения, score) правим так же, как REST:
+    # запоминаем значения до правки, после commit - переносим разницу
+    async def on_model_change(self, data, model, is_created, request):
+        if not is_created:
+            model._aggregates_before = (model.location_id, ratings.ReviewValues.of(model))
+
+    async def after_model_change(self, data, model, is_created, request):
+        old_location_id, old = getattr(model, "_aggregates_before", (None, None))
+        async with async_session_maker() as session:
+            await ratings.move_review(session, old_location_id, old, model.location_id, model)
+            if old_location_id is not None and old_location_id != model.location_id:
+                await changes.bump_location_version(session, old_location_id)
+            await session.commit()
+        await changes.record_change_now(changes.REVIEW, model.id, location_id=model.location_id)
+        # Локация могла смениться - сбрасываем кэш карты целиком
+        await bbox_cache.clear()
+
+    async def after_model_delete(self, model, request):
+        if model.location_id is not None:
+            async with async_session_maker() as session:
+                await ratings.remove_review(session, model.location_id, model)
+                await session.commit()
+        await changes.record_change_now(changes.REVIEW, model.id, changes.DELETE, location_id=model.location_id)
+        await bbox_cache.clear()
+
 # 5. Картинки
 class PictureAdmin(ModelView, model=Picture):
     name = "Фотография"
@@ -104,6 +182,14 @@ class PictureAdmin(ModelView, model=Picture):
     icon = "fa-solid fa-image"
     column_list = [Picture.id, Picture.url, Picture.location, Picture.uploader]
 
+    async def after_model_change(self, data, model, is_created, request):
+        await changes.record_change_now(changes.PICTURE, model.id, location_id=model.location_id)
+        await bbox_cache.clear()
+
+    async def after_model_delete(self, model, request):
+        await changes.record_change_now(changes.PICTURE, model.id, changes.DELETE, location_id=model.location_id)
+        await bbox_cache.clear()
+
 # --- СПРАВОЧНИКИ (Dictionaries) ---
 
 class TypeOfSeatAdmin(ModelView, model=TypeOfSeat):
@@ -116,7 +202,15 @@ class StatusAdmin(ModelView, model=Status):
     name = "Статус"
     name_plural = "Статусы"
     icon = "fa-solid fa-info-circle"
-    column_list = [Status.id, Status.name]
+    column_list = [Status.id, Status.name, Status.is_public]
+
+    async def after_model_change(self, data, model, is_created, request):
+        status_registry.invalidate()
+        await bbox_cache.clear()
+
+    async def after_model_delete(self, model, request):
+        status_registry.invalidate()
+        await bbox_cache.clear()
 
 class PollutionAdmin(ModelView, model=Pollution):
     name = "Загрязнение"
@@ -124,18 +218,36 @@ class PollutionAdmin(ModelView, model=Pollution):
     icon = "fa-solid fa-trash"
     column_list = [Pollution.id, Pollution.name]
 
+    async def after_model_change(self, data, model, is_created, request):
+        review_dictionaries.invalidate()
+
+    async def after_model_delete(self, model, request):
+        review_dictionaries.invalidate()
+
 class ConditionAdmin(ModelView, model=Condition):
     name = "Состояние"
     name_plural = "Состояния"
     icon = "fa-solid fa-hammer"
     column_list = [Condition.id, Condition.name]
 
+    async def after_model_change(self, data, model, is_created, request):
+        review_dictionaries.invalidate()
+
+    async def after_model_delete(self, model, request):
+        review_dictionaries.invalidate()
+
 class MaterialAdmin(ModelView, model=Material):
     name = "Материал"
     name_plural = "Материалы"
     icon = "fa-solid fa-layer-group"
     column_list = [Material.id, Material.name]
 
+    async def after_model_change(self, data, model, is_created, request):
+        review_dictionaries.invalidate()
+
+    async def after_model_delete(self, model, request):
+        review_dictionaries.invalidate()
+
 
 
 class LocationSeatOfReviewAdmin(ModelView, model=LocationSeatOfReview):
@@ -143,6 +255,10 @@ class LocationSeatOfReviewAdmin(ModelView, model=LocationSeatOfReview):
     name_plural = "Связи Локация-Отзыв"
     icon = "fa-solid fa-link"
     column_list = [LocationSeatOfReview.id, LocationSeatOfReview.location, LocationSeatOfReview.review]
+    # Это VIEW поверх Reviews.location_id: локацию отзыва меняют в разделе "Отзывы"
+    can_create = False
+    can_edit = False
+    can_delete = False
 
 
 
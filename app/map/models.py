@@ -1,9 +1,12 @@
 from datetime import datetime
 from decimal import Decimal
 from typing import Optional, List
-from sqlalchemy import ForeignKey, String, DECIMAL, TIMESTAMP, BigInteger,UniqueConstraint
+from sqlalchemy import ForeignKey, String, DECIMAL, TIMESTAMP, BigInteger,UniqueConstraint, Index, Computed, event
+from sqlalchemy import Table, MetaData, Column, Integer, Float
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base, int_pk, created_at, updated_at, str_uniq
+from app import geo
 
 
 class Role(Base):
@@ -63,6 +66,8 @@ class Status(Base):
     
     id: Mapped[int_pk]
     name: Mapped[str] = mapped_column(String(255))
+    # Локации с этим статусом видны всем (а не только автору и админу)
+    is_public: Mapped[bool] = mapped_column(default=False, server_default='false')
     
     locations: Mapped[List['LocationSeat']] = relationship(
         back_populates='status_ref',
@@ -82,7 +87,24 @@ class LocationSeat(Base):
     cord_x: Mapped[Decimal] = mapped_column(DECIMAL(20, 15))
     cord_y: Mapped[Decimal] = mapped_column(DECIMAL(20, 15))
     author_id: Mapped[int] = mapped_column(ForeignKey('Users.id'))
-    status: Mapped[int] = mapped_column(ForeignKey('Statuses.id'))
+    status: Mapped[int] = mapped_column(ForeignKey('Statuses.id'), index=True)
+    # Ячейка geohash по координатам (пересчитывается при вставке/обновлении)
+    geohash: Mapped[Optional[str]] = mapped_column(
+        String(geo.GEOHASH_PRECISION, collation="C"), index=True, nullable=True
+    )
+    # Версия: растёт при любом изменении локации, её отзывов и фото (для ETag)
+    version: Mapped[int] = mapped_column(BigInteger, default=1, server_default='1')
+    # Полнотекстовый поиск (русская морфология): считается самой БД, в выборки не попадает
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(address, '')), 'B') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'C')",
+            persisted=True
+        ),
+        deferred=True
+    )
     
     
     # --- Отношения ---
@@ -100,19 +122,12 @@ class LocationSeat(Base):
     )
 
     # --- Связь с отзывами ---
-    # 1. Прямой доступ к списку отзывов (только для чтения)
+    # Отзыв ссылается на локацию напрямую (Review.location_id). При удалении
+    # локации БД обнуляет ссылку, сам отзыв остаётся ("Локация удалена")
     reviews: Mapped[List['Review']] = relationship(
         "Review",
-        secondary='Location_seats_of_Reviews',
-        back_populates='locations',
-        viewonly=True 
-    )
-    
-    # 2. Доступ к промежуточным объектам (для добавления/удаления связей)
-    review_links: Mapped[List['LocationSeatOfReview']] = relationship(
-        "LocationSeatOfReview",
         back_populates='location',
-        cascade="all, delete-orphan"
+        passive_deletes=True
     )
     
     pictures: Mapped[List['Picture']] = relationship(
@@ -121,9 +136,104 @@ class LocationSeat(Base):
         cascade="all, delete-orphan"
     )
 
+    # Агрегаты по отзывам (отдельная таблица, отзывы не загружаются)
+    rating: Mapped[Optional['LocationRating']] = relationship(
+        "LocationRating",
+        back_populates='location',
+        uselist=False,
+        # Грузится явно (selectinload) только там, где агрегаты попадают в ответ
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
+
+    @property
+    def review_count(self) -> int:
+        return self.rating.review_count if self.rating else 0
+
+    __table_args__ = (
+        # Keyset-пагинация "моих локаций"
+        Index('ix_Location_seats_author_id_id', 'author_id', 'id'),
+        # Поиск: tsvector и триграммы (опечатки) по названию и адресу
+        Index('ix_Location_seats_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_Location_seats_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        Index('ix_Location_seats_address_trgm', 'address', postgresql_using='gin', postgresql_ops={'address': 'gin_trgm_ops'}),
+    )
+
     def __str__(self):
         return self.name
 
+
+@event.listens_for(LocationSeat, "before_insert")
+@event.listens_for(LocationSeat, "before_update")
+def _fill_geohash(mapper, connection, target: LocationSeat):
+    if target.cord_x is not None and target.cord_y is not None:
+        target.geohash = geo.encode(target.cord_x, target.cord_y)
+
+
+class LocationRating(Base):
+    """
+    Денормализованные агрегаты отзывов локации.
+    Обновляются в роутерах отзывов (app/ratings.py), пересобираются rebuild_ratings.py
+    """
+    __tablename__ = 'Location_ratings'
+
+    location_id: Mapped[int] = mapped_column(
+        ForeignKey('Location_seats.id', ondelete="CASCADE"), primary_key=True
+    )
+    review_count: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+    rating_sum: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+    seating_sum: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+    # Гистограмма оценок
+    rate_1: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+    rate_2: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+    rate_3: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+    rate_4: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+    rate_5: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+    # Рейтинг "лучшие рядом" (app/ranking.py): суммы весов отзывов, байесовский score
+    # и ячейка geohash локации для индекса (cell, score)
+    weight_sum: Mapped[float] = mapped_column(Float, default=0, server_default='0')
+    weighted_rate_sum: Mapped[float] = mapped_column(Float, default=0, server_default='0')
+    score: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    cell: Mapped[Optional[str]] = mapped_column(String(5, collation='C'), nullable=True)
+
+    location: Mapped['LocationSeat'] = relationship(
+        "LocationSeat",
+        back_populates='rating'
+    )
+
+    __table_args__ = (
+        # Top K по ячейке прямо из индекса: WHERE cell = ... ORDER BY score DESC LIMIT K
+        Index('ix_Location_ratings_cell_score', 'cell', 'score'),
+    )
+
+    @property
+    def avg_rate(self) -> Optional[float]:
+        return self.rating_sum / self.review_count if self.review_count else None
+
+    @property
+    def avg_seating_positions(self) -> Optional[float]:
+        return self.seating_sum / self.review_count if self.review_count else None
+
+    @property
+    def rate_histogram(self) -> List[int]:
+        return [self.rate_1, self.rate_2, self.rate_3, self.rate_4, self.rate_5]
+
+
+class LocationReviewStat(Base):
+    """
+    Распределения полей отзывов локации: сколько отзывов с данным значением.
+    kind - pollution / condition / material / seating (value - id справочника
+    или число мест). Обновляются вместе с Location_ratings (app/ratings.py).
+    """
+    __tablename__ = 'Location_review_stats'
+
+    location_id: Mapped[int] = mapped_column(
+        ForeignKey('Location_seats.id', ondelete="CASCADE"), primary_key=True
+    )
+    kind: Mapped[str] = mapped_column(String(16), primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+
     
 class Picture(Base):
     __tablename__ = 'Pictures' # Лучше назвать во множественном числе
@@ -199,6 +309,11 @@ class Review(Base):
     condition_id: Mapped[int] = mapped_column(ForeignKey('Conditions.id'))
     material_id: Mapped[int] = mapped_column(ForeignKey('Materials.id'))
     seating_positions: Mapped[int] = mapped_column(BigInteger)
+    location_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey('Location_seats.id', ondelete="SET NULL"), nullable=True
+    )
+    # id отзыва на устройстве (офлайн-очередь): повтор той же отправки не создаёт дубль
+    client_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     
     # Отношения
     author: Mapped['User'] = relationship(
@@ -218,43 +333,60 @@ class Review(Base):
         foreign_keys=[material_id]
     )
     
-    # --- Связь с локациями ---
-    # 1. Прямой доступ к списку локаций (только для чтения)
-    locations: Mapped[List['LocationSeat']] = relationship(
-        "LocationSeat",
-        secondary='Location_seats_of_Reviews',
+    # Локация отзыва (NULL - локацию удалили)
+    location: Mapped[Optional['LocationSeat']] = relationship(
         back_populates='reviews',
-        viewonly=True 
+        foreign_keys=[location_id]
     )
-    
-    # 2. Доступ к промежуточным объектам
-    location_links: Mapped[List['LocationSeatOfReview']] = relationship(
-        "LocationSeatOfReview",
-        back_populates='review',
-        cascade="all, delete-orphan"
+
+    __table_args__ = (
+        # Отзывы локации, keyset по (created_at, id); он же индекс внешнего ключа
+        Index('ix_Reviews_location_id_created_at_id', 'location_id', 'created_at', 'id'),
+        # "Мои отзывы": новые сверху, keyset по (created_at, id)
+        Index('ix_Reviews_author_id_created_at_id', 'author_id', 'created_at', 'id'),
+        UniqueConstraint('author_id', 'client_id', name='uq_Reviews_author_id_client_id'),
     )
 
     def __str__(self):
         return f"Отзыв {self.id} (Оценка: {self.rate})"
+# Бывшая таблица связей локация-отзыв. Теперь это VIEW поверх Reviews.location_id
+# (для админки и старых отчётов), поэтому своя MetaData - Alembic её не трогает
+location_review_links = Table(
+    'Location_seats_of_Reviews', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('locations_id', Integer),
+    Column('reviews_id', Integer),
+    Column('created_at', TIMESTAMP),
+    Column('updated_at', TIMESTAMP),
+)
+
+
 class LocationSeatOfReview(Base):
-    __tablename__ = 'Location_seats_of_Reviews'
-    
-    id: Mapped[int_pk]
-    locations_id: Mapped[int] = mapped_column(ForeignKey('Location_seats.id'))
-    reviews_id: Mapped[int] = mapped_column(ForeignKey('Reviews.id'))
-    
-    # Связи с объектами
+    """Только для чтения: одна строка на отзыв с непустым location_id"""
+    __table__ = location_review_links
+
     location: Mapped['LocationSeat'] = relationship(
-        back_populates='review_links',
-        foreign_keys=[locations_id]
+        primaryjoin='foreign(LocationSeatOfReview.locations_id) == LocationSeat.id',
+        viewonly=True
     )
     review: Mapped['Review'] = relationship(
-        back_populates='location_links',
-        foreign_keys=[reviews_id]
-    )
-    
-    __table_args__ = (
-        UniqueConstraint('locations_id', 'reviews_id', name='unique_location_review'),
+        primaryjoin='foreign(LocationSeatOfReview.reviews_id) == Review.id',
+        viewonly=True
     )
 
 
+
+
+class ChangeLog(Base):
+    """
+    Журнал изменений для дельта-синхронизации мобильного клиента.
+    id - монотонный токен синхронизации, удаления хранятся как tombstone (operation='delete').
+    """
+    __tablename__ = 'Change_log'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    entity: Mapped[str] = mapped_column(String(16))  # location / review / picture
+    entity_id: Mapped[int]
+    operation: Mapped[str] = mapped_column(String(8))  # upsert / delete
+    # Локация, к которой относится запись (без FK: tombstone переживает локацию)
+    location_id: Mapped[Optional[int]] = mapped_column(nullable=True)
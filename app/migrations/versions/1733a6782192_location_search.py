@@ -0,0 +1,59 @@
+"""location search
+
+Revision ID: 1733a6782192
+Revises: f2e643a97284
+Create Date: 2026-10-18 15:21:47.530118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1733a6782192'
+down_revision: Union[str, Sequence[str], None] = 'f2e643a97284'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Хранимая вычисляемая колонка: таблица перезаписывается один раз при миграции
+    op.add_column(
+        'Location_seats',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+                "setweight(to_tsvector('russian', coalesce(address, '')), 'B') || "
+                "setweight(to_tsvector('russian', coalesce(description, '')), 'C')",
+                persisted=True
+            ),
+            nullable=True
+        )
+    )
+    op.create_index(
+        'ix_Location_seats_search_vector', 'Location_seats', ['search_vector'],
+        unique=False, postgresql_using='gin'
+    )
+    op.create_index(
+        'ix_Location_seats_name_trgm', 'Location_seats', ['name'],
+        unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_Location_seats_address_trgm', 'Location_seats', ['address'],
+        unique=False, postgresql_using='gin', postgresql_ops={'address': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_Location_seats_address_trgm', table_name='Location_seats')
+    op.drop_index('ix_Location_seats_name_trgm', table_name='Location_seats')
+    op.drop_index('ix_Location_seats_search_vector', table_name='Location_seats')
+    op.drop_column('Location_seats', 'search_vector')
@@ -0,0 +1,56 @@
+"""location ratings
+
+Revision ID: 1c58dc8883c9
+Revises: 80e3a42fdb1f
+Create Date: 2026-10-18 11:48:09.127733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c58dc8883c9'
+down_revision: Union[str, Sequence[str], None] = '80e3a42fdb1f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = ['review_count', 'rating_sum', 'seating_sum', 'rate_1', 'rate_2', 'rate_3', 'rate_4', 'rate_5']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'Location_ratings',
+        sa.Column('location_id', sa.Integer(), nullable=False),
+        *[sa.Column(name, sa.BigInteger(), server_default='0', nullable=False) for name in COUNTERS],
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['location_id'], ['Location_seats.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('location_id')
+    )
+
+    # Заполняем агрегаты по уже существующим отзывам
+    op.execute('''
+        INSERT INTO "Location_ratings"
+            (location_id, review_count, rating_sum, seating_sum, rate_1, rate_2, rate_3, rate_4, rate_5)
+        SELECT l.locations_id,
+               count(r.id),
+               sum(r.rate),
+               sum(r.seating_positions),
+               count(*) FILTER (WHERE r.rate = 1),
+               count(*) FILTER (WHERE r.rate = 2),
+               count(*) FILTER (WHERE r.rate = 3),
+               count(*) FILTER (WHERE r.rate = 4),
+               count(*) FILTER (WHERE r.rate = 5)
+        FROM "Location_seats_of_Reviews" l
+        JOIN "Reviews" r ON r.id = l.reviews_id
+        GROUP BY l.locations_id
+    ''')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('Location_ratings')
@@ -0,0 +1,56 @@
+"""location review stats
+
+Revision ID: 5b2d7e91c4a8
+Revises: 1733a6782192
+Create Date: 2026-10-18 19:02:41.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2d7e91c4a8'
+down_revision: Union[str, Sequence[str], None] = '1733a6782192'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# kind -> колонка отзыва
+STAT_KINDS = {
+    'pollution': 'pollution_id',
+    'condition': 'condition_id',
+    'material': 'material_id',
+    'seating': 'seating_positions',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'Location_review_stats',
+        sa.Column('location_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.Column('count', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['location_id'], ['Location_seats.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('location_id', 'kind', 'value')
+    )
+
+    # Заполняем распределения по уже существующим отзывам
+    for kind, column in STAT_KINDS.items():
+        op.execute(f'''
+            INSERT INTO "Location_review_stats" (location_id, kind, value, count)
+            SELECT l.locations_id, '{kind}', r.{column}, count(r.id)
+            FROM "Location_seats_of_Reviews" l
+            JOIN "Reviews" r ON r.id = l.reviews_id
+            GROUP BY l.locations_id, r.{column}
+        ''')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('Location_review_stats')
@@ -0,0 +1,31 @@
+"""location version
+
+Revision ID: 71dd510ece1c
+Revises: f6e7f22a2b53
+Create Date: 2026-10-18 13:07:26.914402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '71dd510ece1c'
+down_revision: Union[str, Sequence[str], None] = 'f6e7f22a2b53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'Location_seats',
+        sa.Column('version', sa.BigInteger(), server_default='1', nullable=False)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('Location_seats', 'version')
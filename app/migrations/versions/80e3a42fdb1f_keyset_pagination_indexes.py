@@ -0,0 +1,30 @@
+"""keyset pagination indexes
+
+Revision ID: 80e3a42fdb1f
+Revises: 9f9ad432de6e
+Create Date: 2026-10-18 11:02:17.504913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '80e3a42fdb1f'
+down_revision: Union[str, Sequence[str], None] = '9f9ad432de6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_Reviews_created_at_id', 'Reviews', ['created_at', 'id'], unique=False)
+    op.create_index('ix_Location_seats_author_id_id', 'Location_seats', ['author_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_Location_seats_author_id_id', table_name='Location_seats')
+    op.drop_index('ix_Reviews_created_at_id', table_name='Reviews')
@@ -0,0 +1,40 @@
+"""review client id
+
+Revision ID: 8d41f0b7e6c3
+Revises: c3e8a1f5d902
+Create Date: 2026-10-18 21:05:12.640391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41f0b7e6c3'
+down_revision: Union[str, Sequence[str], None] = 'c3e8a1f5d902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('Reviews', sa.Column('client_id', sa.String(length=64), nullable=True))
+
+    # Уникальный индекс строим без блокировки записи, потом превращаем в ограничение
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "uq_Reviews_author_id_client_id" '
+            'ON "Reviews" (author_id, client_id)'
+        )
+    op.execute(
+        'ALTER TABLE "Reviews" ADD CONSTRAINT "uq_Reviews_author_id_client_id" '
+        'UNIQUE USING INDEX "uq_Reviews_author_id_client_id"'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_Reviews_author_id_client_id', 'Reviews', type_='unique')
+    op.drop_column('Reviews', 'client_id')
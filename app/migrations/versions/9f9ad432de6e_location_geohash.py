@@ -0,0 +1,63 @@
+"""location geohash
+
+Revision ID: 9f9ad432de6e
+Revises:
+Create Date: 2026-10-18 10:12:41.318245
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app import geo
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f9ad432de6e'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+location_seats = sa.table(
+    'Location_seats',
+    sa.column('id', sa.Integer),
+    sa.column('cord_x', sa.DECIMAL(20, 15)),
+    sa.column('cord_y', sa.DECIMAL(20, 15)),
+    sa.column('geohash', sa.String),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'Location_seats',
+        sa.Column('geohash', sa.String(length=geo.GEOHASH_PRECISION, collation='C'), nullable=True)
+    )
+
+    # Заполняем geohash для уже существующих локаций пачками
+    conn = op.get_bind()
+    while True:
+        rows = conn.execute(
+            sa.select(location_seats.c.id, location_seats.c.cord_x, location_seats.c.cord_y)
+            .where(location_seats.c.geohash.is_(None))
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            location_seats.update()
+            .where(location_seats.c.id == sa.bindparam('_id'))
+            .values(geohash=sa.bindparam('_geohash')),
+            [{'_id': row.id, '_geohash': geo.encode(row.cord_x, row.cord_y)} for row in rows]
+        )
+
+    op.create_index(op.f('ix_Location_seats_geohash'), 'Location_seats', ['geohash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_Location_seats_geohash'), table_name='Location_seats')
+    op.drop_column('Location_seats', 'geohash')
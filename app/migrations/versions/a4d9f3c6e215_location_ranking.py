@@ -0,0 +1,61 @@
+"""location ranking
+
+Revision ID: a4d9f3c6e215
+Revises: e7a2c94b1d56
+Create Date: 2026-10-18 22:31:05.640318
+
+Суммы весов для байесовской оценки (app/ranking.py) и ячейка локации.
+Заполняются пачками по location_id с весом 1 (без затухания); score
+посчитает фоновая задача при старте приложения. Если включено затухание
+(RANKING_HALF_LIFE_DAYS > 0) - после миграции запустить rebuild_ratings.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d9f3c6e215'
+down_revision: Union[str, Sequence[str], None] = 'e7a2c94b1d56'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('Location_ratings', sa.Column('weight_sum', sa.Float(), server_default='0', nullable=False))
+    op.add_column('Location_ratings', sa.Column('weighted_rate_sum', sa.Float(), server_default='0', nullable=False))
+    op.add_column('Location_ratings', sa.Column('score', sa.Float(), nullable=True))
+    op.add_column('Location_ratings', sa.Column('cell', sa.String(length=5, collation='C'), nullable=True))
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        max_id = conn.execute(sa.text('SELECT coalesce(max(location_id), 0) FROM "Location_ratings"')).scalar()
+        for start in range(0, max_id, BATCH_SIZE):
+            conn.execute(
+                sa.text('''
+                    UPDATE "Location_ratings" r
+                    SET weight_sum = r.review_count,
+                        weighted_rate_sum = r.rating_sum,
+                        cell = left(l.geohash, 5)
+                    FROM "Location_seats" l
+                    WHERE l.id = r.location_id AND r.location_id > :start AND r.location_id <= :stop
+                '''),
+                {'start': start, 'stop': start + BATCH_SIZE}
+            )
+        op.create_index(
+            'ix_Location_ratings_cell_score', 'Location_ratings', ['cell', 'score'],
+            unique=False, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_Location_ratings_cell_score', table_name='Location_ratings')
+    op.drop_column('Location_ratings', 'cell')
+    op.drop_column('Location_ratings', 'score')
+    op.drop_column('Location_ratings', 'weighted_rate_sum')
+    op.drop_column('Location_ratings', 'weight_sum')
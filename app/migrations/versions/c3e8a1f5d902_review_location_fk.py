@@ -0,0 +1,123 @@
+"""review location fk
+
+Revision ID: c3e8a1f5d902
+Revises: 5b2d7e91c4a8
+Create Date: 2026-10-18 20:14:37.902113
+
+Отзыв ссылается на локацию напрямую (Reviews.location_id) вместо таблицы
+связей. Миграция рассчитана на работающую базу: внешний ключ добавляется
+NOT VALID и проверяется отдельно, ссылки переносятся пачками по id
+(каждая пачка - своя транзакция), индекс (location_id, created_at, id)
+строится CONCURRENTLY и заменяет (created_at, id) из keyset-пагинации.
+Перед заменой таблицы связей она блокируется и остаток связей переносится
+под блокировкой. Таблица Location_seats_of_Reviews заменяется VIEW с теми же колонками.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1f5d902'
+down_revision: Union[str, Sequence[str], None] = '5b2d7e91c4a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+LINKS_VIEW = '''
+    CREATE VIEW "Location_seats_of_Reviews" AS
+    SELECT id, location_id AS locations_id, id AS reviews_id, created_at, updated_at
+    FROM "Reviews"
+    WHERE location_id IS NOT NULL
+'''
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('Reviews', sa.Column('location_id', sa.Integer(), nullable=True))
+    # NOT VALID - без полного скана Reviews под блокировкой
+    op.execute('''
+        ALTER TABLE "Reviews" ADD CONSTRAINT "Reviews_location_id_fkey"
+        FOREIGN KEY (location_id) REFERENCES "Location_seats" (id) ON DELETE SET NULL NOT VALID
+    ''')
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        max_id = conn.execute(sa.text('SELECT coalesce(max(id), 0) FROM "Reviews"')).scalar()
+        # Переносим ссылки пачками по диапазону id (у отзыва одна локация, min - на всякий случай)
+        for start in range(0, max_id, BATCH_SIZE):
+            conn.execute(
+                sa.text('''
+                    UPDATE "Reviews" r SET location_id = l.locations_id
+                    FROM (
+                        SELECT reviews_id, min(locations_id) AS locations_id
+                        FROM "Location_seats_of_Reviews"
+                        WHERE reviews_id > :start AND reviews_id <= :stop
+                        GROUP BY reviews_id
+                    ) l
+                    WHERE r.id = l.reviews_id AND r.location_id IS NULL
+                '''),
+                {'start': start, 'stop': start + BATCH_SIZE}
+            )
+        # Отзывы локации: WHERE location_id = ... ORDER BY created_at DESC, id DESC (и поиск по внешнему ключу);
+        # (created_at, id) без локации этот запрос не обслуживал
+        op.execute('''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS "ix_Reviews_location_id_created_at_id"
+            ON "Reviews" (location_id, created_at, id)
+        ''')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS "ix_Reviews_created_at_id"')
+
+    # Работающее приложение могло добавить связи во время переноса (новые отзывы
+    # с id > max_id или связи в уже пройденных пачках). Блокируем таблицу связей
+    # до конца миграции и догоняем остаток одним запросом.
+    conn = op.get_bind()
+    op.execute('LOCK TABLE "Location_seats_of_Reviews" IN ACCESS EXCLUSIVE MODE')
+    op.execute('''
+        UPDATE "Reviews" r SET location_id = l.locations_id
+        FROM (
+            SELECT reviews_id, min(locations_id) AS locations_id
+            FROM "Location_seats_of_Reviews"
+            GROUP BY reviews_id
+        ) l
+        WHERE r.id = l.reviews_id AND r.location_id IS NULL
+    ''')
+    unlinked = conn.execute(sa.text('''
+        SELECT count(*) FROM "Reviews" r
+        WHERE r.location_id IS NULL
+          AND EXISTS (SELECT 1 FROM "Location_seats_of_Reviews" l WHERE l.reviews_id = r.id)
+    ''')).scalar()
+    if unlinked:
+        raise RuntimeError(f"{unlinked} отзывов со связью остались без location_id, таблица связей не удалена")
+
+    op.execute('ALTER TABLE "Reviews" VALIDATE CONSTRAINT "Reviews_location_id_fkey"')
+
+    # Старая таблица связей -> совместимое представление (админка, отчёты)
+    op.drop_table('Location_seats_of_Reviews')
+    op.execute(LINKS_VIEW)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP VIEW "Location_seats_of_Reviews"')
+    op.create_table(
+        'Location_seats_of_Reviews',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('locations_id', sa.Integer(), nullable=False),
+        sa.Column('reviews_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['locations_id'], ['Location_seats.id']),
+        sa.ForeignKeyConstraint(['reviews_id'], ['Reviews.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('locations_id', 'reviews_id', name='unique_location_review')
+    )
+    op.execute('''
+        INSERT INTO "Location_seats_of_Reviews" (locations_id, reviews_id)
+        SELECT location_id, id FROM "Reviews" WHERE location_id IS NOT NULL
+    ''')
+    op.create_index('ix_Reviews_created_at_id', 'Reviews', ['created_at', 'id'], unique=False)
+    op.drop_index('ix_Reviews_location_id_created_at_id', table_name='Reviews')
+    op.drop_constraint('Reviews_location_id_fkey', 'Reviews', type_='foreignkey')
+    op.drop_column('Reviews', 'location_id')
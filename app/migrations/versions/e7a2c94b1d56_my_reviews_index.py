@@ -0,0 +1,32 @@
+"""my reviews index
+
+Revision ID: e7a2c94b1d56
+Revises: 8d41f0b7e6c3
+Create Date: 2026-10-18 21:48:30.117254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a2c94b1d56'
+down_revision: Union[str, Sequence[str], None] = '8d41f0b7e6c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_Reviews_author_id_created_at_id', 'Reviews', ['author_id', 'created_at', 'id'],
+            unique=False, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_Reviews_author_id_created_at_id', table_name='Reviews')
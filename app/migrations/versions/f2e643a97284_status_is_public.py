@@ -0,0 +1,40 @@
+"""status is_public
+
+Revision ID: f2e643a97284
+Revises: 71dd510ece1c
+Create Date: 2026-10-18 14:02:11.408215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2e643a97284'
+down_revision: Union[str, Sequence[str], None] = '71dd510ece1c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'Statuses',
+        sa.Column('is_public', sa.Boolean(), server_default='false', nullable=False)
+    )
+    # Раньше публичные статусы были зашиты в код по названию
+    op.execute(
+        """
+        UPDATE "Statuses" SET is_public = true
+        WHERE name IN ('Активно', 'На ремонте')
+        """
+    )
+    op.create_index(op.f('ix_Location_seats_status'), 'Location_seats', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_Location_seats_status'), table_name='Location_seats')
+    op.drop_column('Statuses', 'is_public')
@@ -0,0 +1,54 @@
+"""change log
+
+Revision ID: f6e7f22a2b53
+Revises: 1c58dc8883c9
+Create Date: 2026-10-18 12:31:54.660127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6e7f22a2b53'
+down_revision: Union[str, Sequence[str], None] = '1c58dc8883c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'Change_log',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('entity', sa.String(length=16), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('operation', sa.String(length=8), nullable=False),
+        sa.Column('location_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Уже существующие данные попадают в журнал как upsert, чтобы since=0 отдавал всё
+    op.execute('''
+        INSERT INTO "Change_log" (entity, entity_id, operation, location_id)
+        SELECT 'location', id, 'upsert', id FROM "Location_seats"
+    ''')
+    op.execute('''
+        INSERT INTO "Change_log" (entity, entity_id, operation, location_id)
+        SELECT 'review', r.id, 'upsert', l.locations_id
+        FROM "Reviews" r
+        LEFT JOIN "Location_seats_of_Reviews" l ON l.reviews_id = r.id
+    ''')
+    op.execute('''
+        INSERT INTO "Change_log" (entity, entity_id, operation, location_id)
+        SELECT 'picture', id, 'upsert', location_id FROM "Pictures"
+    ''')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('Change_log')
@@ -0,0 +1,94 @@
+"""
+Компактный бинарный формат данных карты (Accept: application/x-msgpack).
+
+Вместо списка объектов - msgpack-словарь параллельных массивов:
+координаты в микроградусах и id как int32 little-endian (bin), справочники - их id.
+
+    {"v": 1, "n": 2, "id": bin, "lat": bin, "lon": bin,
+     "name": [...], "type": [...], "status": [...], "rate10": [...], "reviews": [...]}
+
+rate10 - средняя оценка x10 (0..50), -1 если отзывов нет.
+"""
+import sys
+from array import array
+from typing import Iterable, List
+
+import msgpack
+from fastapi import Request
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+FORMAT_VERSION = 1
+
+MICRODEGREES = 1_000_000
+
+
+def wants_msgpack(request: Request) -> bool:
+    return MSGPACK_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _int32(values: Iterable[int]) -> bytes:
+    packed = array("i", values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _from_int32(data: bytes) -> List[int]:
+    packed = array("i")
+    packed.frombytes(data)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tolist()
+
+
+def _micro(value) -> int:
+    return round(float(value) * MICRODEGREES)
+
+
+def pack_pins(pins: List[dict]) -> bytes:
+    """Маркеры (поля LocationPin) -> msgpack колонками"""
+    return msgpack.packb({
+        "v": FORMAT_VERSION,
+        "n": len(pins),
+        "id": _int32(p["id"] for p in pins),
+        "lat": _int32(_micro(p["cord_x"]) for p in pins),
+        "lon": _int32(_micro(p["cord_y"]) for p in pins),
+        "name": [p["name"] for p in pins],
+        "type": [p["type"] for p in pins],
+        "status": [p["status"] for p in pins],
+        "rate10": [round(float(p["avg_rate"]) * 10) if p["avg_rate"] is not None else -1 for p in pins],
+        "reviews": [p["review_count"] for p in pins],
+    }, use_bin_type=True)
+
+
+def unpack_pins(data: bytes) -> List[dict]:
+    """Обратное преобразование (для проверки и бенчмарка; клиент делает то же самое)"""
+    packed = msgpack.unpackb(data, raw=False)
+    ids = _from_int32(packed["id"])
+    lats = _from_int32(packed["lat"])
+    lons = _from_int32(packed["lon"])
+    return [
+        {
+            "id": ids[i],
+            "name": packed["name"][i],
+            "cord_x": lats[i] / MICRODEGREES,
+            "cord_y": lons[i] / MICRODEGREES,
+            "type": packed["type"][i],
+            "status": packed["status"][i],
+            "avg_rate": packed["rate10"][i] / 10 if packed["rate10"][i] >= 0 else None,
+            "review_count": packed["reviews"][i],
+        }
+        for i in range(packed["n"])
+    ]
+
+
+def pack_clusters(clusters: List[dict]) -> bytes:
+    """Кластеры карты -> msgpack колонками (location_id = 0 у настоящих кластеров)"""
+    return msgpack.packb({
+        "v": FORMAT_VERSION,
+        "n": len(clusters),
+        "lat": _int32(_micro(c["lat"]) for c in clusters),
+        "lon": _int32(_micro(c["lon"]) for c in clusters),
+        "count": _int32(c["count"] for c in clusters),
+        "location_id": _int32(c["location_id"] or 0 for c in clusters),
+    }, use_bin_type=True)
@@ -64,24 +64,52 @@ class ReviewCreate(ReviewBase):
 
     location_id: int = Field(..., gt=0, description="ID локации, к которой пишем отзыв")
 
+class ReviewListItem(ReviewBase):
+    """
+    Строка списка "мои отзывы": поля ReviewResponse плюс точка локации,
+    собранные одной выборкой колонок (без загрузки автора и локации)
+    """
+    id: int
+    author_id: int
+    created_at: datetime
+    location_name: str
+    author_username: str
+    # None - локация удалена
+    location_cord_x: Optional[Decimal] = None
+    location_cord_y: Optional[Decimal] = None
+
+MAX_REVIEW_BATCH = 500
+
+class ReviewBatchItem(ReviewCreate):
+    # Генерирует клиент (UUID): повторная отправка той же пачки не создаёт дублей
+    client_id: str = Field(..., min_length=1, max_length=64)
+
+class ReviewBatchCreate(BaseModel):
+    """Отзывы, накопленные приложением без сети"""
+    reviews: List[ReviewBatchItem] = Field(..., min_length=1, max_length=MAX_REVIEW_BATCH)
+
+class ReviewBatchResult(BaseModel):
+    """Итог по одному отзыву пачки"""
+    client_id: str
+    # created - создан, duplicate - уже был создан раньше (id прежний), error - отклонён
+    status: str
+    id: Optional[int] = None
+    error: Optional[str] = None
+
 class ReviewResponse(ReviewBase):
     id: int
     author_id: int      
     created_at: datetime
     
-    # 1. Объявляем скрытые поля, чтобы Pydantic вытащил их из БД
+    # Скрытые поля: связи, из которых считаются имена
     author: Optional[UserBase] = Field(None, exclude=True)
-    location_links: List[Any] = Field([], exclude=True) # <-- ВАЖНО! Нужно объявить это поле
+    location: Optional[Any] = Field(None, exclude=True)
 
-    # 2. Добавляем декоратор
     @computed_field
     def location_name(self) -> str:
-        # Теперь self.location_links доступен
-        if self.location_links and len(self.location_links) > 0:
-            link = self.location_links[0]
-            # Проверяем, загружена ли локация внутри связи
-            if hasattr(link, 'location') and link.location:
-                return link.location.name
+        # Связь подгружена и локация не удалена
+        if self.location is not None:
+            return self.location.name
         return "Локация удалена"
     
     # То же самое для имени автора
@@ -126,12 +154,44 @@ class StatusCreate(StatusBase):
 
 class StatusResponse(StatusBase):
     id: int
+    is_public: bool = False
+
+class LocationRatingResponse(BaseModel):
+    """Агрегаты отзывов локации"""
+    review_count: int = 0
+    avg_rate: Optional[float] = None
+    # Количество оценок 1..5
+    rate_histogram: List[int] = [0, 0, 0, 0, 0]
+    avg_seating_positions: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class DistributionItem(BaseModel):
+    """Значение справочника и число отзывов с ним"""
+    id: int
+    count: int
+
+class ReviewSummaryResponse(BaseModel):
+    """Сводка отзывов локации для экрана локации"""
+    location_id: int
+    review_count: int = 0
+    avg_rate: Optional[float] = None
+    # Количество оценок 1..5
+    rate_histogram: List[int] = [0, 0, 0, 0, 0]
+    pollution: List[DistributionItem] = []
+    condition: List[DistributionItem] = []
+    material: List[DistributionItem] = []
+    median_seating_positions: Optional[float] = None
 
 class LocationSeatResponse(LocationSeatBase):
     id: int
     
     author_id: int
 
+    rating: Optional[LocationRatingResponse] = None
+    # Всего отзывов (встроенных может быть меньше, см. reviews_limit)
+    review_count: int = 0
+
     reviews: List["ReviewResponse"] = [] 
     
     pictures: List[PictureResponse] = [] 
@@ -142,6 +202,96 @@ class LocationSeatResponse(LocationSeatBase):
             Decimal: str  
         }
     )
+class LocationPin(BaseModel):
+    """Облегчённая локация для маркера на карте (без отзывов и фото)"""
+    id: int
+    name: str
+    cord_x: Decimal
+    cord_y: Decimal
+    type: int
+    status: int
+    avg_rate: Optional[float] = None
+    review_count: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+class LocationNearby(LocationPin):
+    distance_m: float = Field(..., description="Расстояние до точки поиска в метрах")
+
+class LocationTopRated(LocationPin):
+    score: float = Field(..., description="Байесовская оценка (больше - лучше)")
+    distance_m: Optional[float] = Field(None, description="Расстояние до точки поиска (если искали по радиусу)")
+
+class LocationSearchResult(LocationPin):
+    address: str
+    rank: float = Field(..., description="Релевантность (больше - лучше)")
+
+class LocationSuggestion(BaseModel):
+    """Подсказка в строке поиска"""
+    id: int
+    name: str
+    address: str
+
+class MapCluster(BaseModel):
+    """Кластер на карте (или одиночная точка, если count == 1)"""
+    lat: float
+    lon: float
+    count: int
+    location_id: Optional[int] = None
+
+class LocationImportRow(LocationSeatBase):
+    """Строка массового импорта: описание и адрес в городских выгрузках часто пустые"""
+    description: str = Field("Не указано", min_length=1, max_length=1000)
+    address: str = Field("Не указано", min_length=1, max_length=500)
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReport(BaseModel):
+    """Итог массового импорта"""
+    total: int
+    inserted: int
+    duplicates: int
+    failed: int
+    errors: List[ImportRowError] = []
+    aborted: Optional[str] = None
+    seconds: float
+    rows_per_sec: float
+
+class CacheStats(BaseModel):
+    """Счётчики кэша окон карты"""
+    hits: int
+    misses: int
+    hit_ratio: float
+    invalidations: int
+    entries: int
+
+class LocationSeatShort(LocationSeatBase):
+    """Локация без вложенных отзывов и фото"""
+    id: int
+    author_id: int
+    rating: Optional[LocationRatingResponse] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class SyncPicture(PictureResponse):
+    location_id: int
+
+class SyncDeleted(BaseModel):
+    locations: List[int] = []
+    reviews: List[int] = []
+    pictures: List[int] = []
+
+class SyncChanges(BaseModel):
+    """Изменения с момента токена since"""
+    token: int = Field(..., description="Передать как since в следующем запросе")
+    has_more: bool = False
+    locations: List[LocationSeatShort] = []
+    reviews: List[ReviewResponse] = []
+    pictures: List[SyncPicture] = []
+    deleted: SyncDeleted = SyncDeleted()
+
 class UserResponse(UserBase):
 
     id: int
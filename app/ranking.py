@@ -0,0 +1,143 @@
+"""
+Рейтинг "лучшие рядом" (GET /locations/top): байесовское среднее оценок.
+
+    score = (C * m + sum(w * rate)) / (C + sum(w))
+
+m - априорная оценка, C - её вес в "виртуальных отзывах" (RANKING_PRIOR_MEAN,
+RANKING_PRIOR_WEIGHT): у локации с парой пятёрок score ниже, чем у локации
+с сотней четвёрок. С затуханием (RANKING_HALF_LIFE_DAYS > 0) вес отзыва
+w = 2^(-возраст / период полураспада).
+
+Суммы весов лежат в Location_ratings "с прямым затуханием": w = 2^((created_at - EPOCH) / T),
+так что новый отзыв только прибавляется к суммам. Текущий множитель
+g = 2^((now - EPOCH) / T) стоит при априорной части: score = (C*m*g + sum) / (C*g + sum_w).
+g растёт со временем, поэтому score пересчитывается фоновой задачей (run_periodic),
+а при записи отзыва - сразу для его локации. После смены периода полураспада
+суммы нужно пересобрать (rebuild_ratings.py).
+
+Ячейка локации cell (geohash точности RANK_CELL_PRECISION) и индекс (cell, score)
+позволяют брать top K по каждой ячейке области прямо из индекса.
+"""
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update, func, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import geo
+from app.config import settings
+from app.database import async_session_maker
+from app.map.models import LocationRating, LocationSeat
+
+# Точка отсчёта весов (раньше всех отзывов)
+EPOCH = datetime(2020, 1, 1)
+# ~4.9 x 4.9 км
+RANK_CELL_PRECISION = 5
+# Сколько локаций пересчитываем за одну транзакцию фоновой задачи
+REFRESH_BATCH = 5000
+# Веса растут как 2^(дни / период): с периодом короче месяца double переполнится за десятилетия
+MIN_HALF_LIFE_DAYS = 30.0
+
+
+def _half_life_seconds() -> float:
+    days = settings.RANKING_HALF_LIFE_DAYS
+    if days <= 0:
+        return 0.0
+    return max(days, MIN_HALF_LIFE_DAYS) * 86400.0
+
+
+def review_weight(created_at: datetime) -> float:
+    half_life = _half_life_seconds()
+    if half_life <= 0 or created_at is None:
+        return 1.0
+    return 2.0 ** ((created_at - EPOCH).total_seconds() / half_life)
+
+
+def weight_sql(created_at):
+    """Вес отзыва выражением SQL (для пересборки по всем отзывам)"""
+    half_life = _half_life_seconds()
+    if half_life <= 0:
+        return literal(1.0)
+    return func.power(2.0, func.extract("epoch", created_at - EPOCH) / half_life)
+
+
+def growth(now: Optional[datetime] = None) -> float:
+    """Множитель g при априорной части на момент now"""
+    return review_weight(now or datetime.utcnow())
+
+
+def score(weighted_rate_sum, weight_sum, g: Optional[float] = None):
+    """
+    score по суммам - числам или выражениям SQL (в UPDATE и ON CONFLICT
+    передаются суммы с уже применёнными приращениями)
+    """
+    g = growth() if g is None else g
+    prior = settings.RANKING_PRIOR_WEIGHT * g
+    return (prior * settings.RANKING_PRIOR_MEAN + weighted_rate_sum) / (prior + weight_sum)
+
+
+def cell_sql(location_id):
+    """Ячейка локации подзапросом (агрегаты пишутся без загрузки локации)"""
+    return (
+        select(func.left(LocationSeat.geohash, RANK_CELL_PRECISION))
+        .where(LocationSeat.id == location_id)
+        .scalar_subquery()
+    )
+
+
+async def update_cell(db: AsyncSession, location_id: int, lat, lon):
+    """Локацию передвинули - переносим её в другую ячейку рейтинга"""
+    await db.execute(
+        update(LocationRating)
+        .where(LocationRating.location_id == location_id)
+        .values(cell=geo.encode(lat, lon, RANK_CELL_PRECISION))
+    )
+
+
+def cell_ranges(min_lat, max_lat, min_lon, max_lon) -> Optional[List[Tuple[str, str]]]:
+    """
+    Диапазоны ячеек рейтинга для bbox; None - bbox шире сетки, фильтра по ячейкам нет.
+    Мелкие ячейки покрытия обрезаются до RANK_CELL_PRECISION (диапазон из одной ячейки).
+    """
+    cells = geo.cover(min_lat, max_lat, min_lon, max_lon)
+    if not cells:
+        return None
+    if len(cells[0]) >= RANK_CELL_PRECISION:
+        return [(cell, cell) for cell in sorted({c[:RANK_CELL_PRECISION] for c in cells})]
+    return geo.cell_ranges(cells)
+
+
+async def refresh_scores(db: AsyncSession):
+    """Пересчитать score (и ячейку) всех локаций пачками по location_id"""
+    g = growth()
+    columns = LocationRating.__table__.c
+    max_id = await db.scalar(select(func.max(LocationRating.location_id)))
+    for start in range(0, max_id or 0, REFRESH_BATCH):
+        await db.execute(
+            update(LocationRating)
+            .where(
+                LocationRating.location_id > start,
+                LocationRating.location_id <= start + REFRESH_BATCH,
+                LocationSeat.id == LocationRating.location_id,
+            )
+            .values(
+                score=score(columns.weighted_rate_sum, columns.weight_sum, g),
+                cell=func.left(LocationSeat.geohash, RANK_CELL_PRECISION),
+            )
+        )
+        await db.commit()
+
+
+async def run_periodic(interval: Optional[float] = None):
+    """Фоновая задача из lifespan: пересчёт сразу при старте, дальше раз в interval секунд"""
+    interval = interval or settings.RANKING_REFRESH_SECONDS
+    while True:
+        try:
+            async with async_session_maker() as session:
+                await refresh_scores(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Не удалось пересчитать рейтинг локаций: {e}")
+        await asyncio.sleep(interval)
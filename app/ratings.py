@@ -0,0 +1,247 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select, update, delete, insert, func, case, literal, tuple_, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import ranking
+from app.map.models import LocationRating, LocationReviewStat, Review
+
+RATE_COLUMNS = {rate: f"rate_{rate}" for rate in range(1, 6)}
+# Распределения в Location_review_stats: kind -> поле отзыва
+STAT_KINDS = {
+    "pollution": "pollution_id",
+    "condition": "condition_id",
+    "material": "material_id",
+    "seating": "seating_positions",
+}
+
+
+class ReviewValues(NamedTuple):
+    """Поля отзыва, от которых зависят агрегаты (снимок до изменения)"""
+    rate: int
+    seating_positions: int
+    pollution_id: int
+    condition_id: int
+    material_id: int
+    # Для веса отзыва в рейтинге (app/ranking.py)
+    created_at: datetime
+
+    @classmethod
+    def of(cls, review) -> "ReviewValues":
+        return cls(*(getattr(review, field) for field in cls._fields))
+
+
+def _deltas(review, sign: int) -> dict:
+    weight = ranking.review_weight(review.created_at)
+    deltas = {
+        "review_count": sign,
+        "rating_sum": sign * review.rate,
+        "seating_sum": sign * review.seating_positions,
+        "weight_sum": sign * weight,
+        "weighted_rate_sum": sign * weight * review.rate,
+    }
+    if review.rate in RATE_COLUMNS:
+        deltas[RATE_COLUMNS[review.rate]] = sign
+    return deltas
+
+
+def _stat_keys(review) -> list:
+    return [(kind, getattr(review, field)) for kind, field in STAT_KINDS.items()]
+
+
+async def add_review(db: AsyncSession, location_id: int, review):
+    """Учесть отзыв в агрегатах локации (в текущей транзакции, атомарно на стороне БД)"""
+    await add_reviews(db, [(location_id, review)])
+
+
+async def add_reviews(db: AsyncSession, items: Iterable[Tuple[int, Any]]):
+    """
+    Пачка отзывов (location_id, отзыв): приращения суммируются по локациям
+    и по значениям, затем по одному многострочному upsert на каждую таблицу.
+    """
+    totals: Dict[int, Counter] = defaultdict(Counter)
+    stat_counts: Counter = Counter()
+    for location_id, review in items:
+        totals[location_id].update(_deltas(review, 1))
+        stat_counts.update((location_id, kind, value) for kind, value in _stat_keys(review))
+    if not totals:
+        return
+
+    keys = ["review_count", "rating_sum", "seating_sum", "weight_sum", "weighted_rate_sum", *RATE_COLUMNS.values()]
+    g = ranking.growth()
+    stmt = pg_insert(LocationRating).values([
+        {
+            "location_id": location_id,
+            **{key: deltas.get(key, 0) for key in keys},
+            "score": ranking.score(deltas["weighted_rate_sum"], deltas["weight_sum"], g),
+            "cell": ranking.cell_sql(location_id),
+        }
+        for location_id, deltas in sorted(totals.items())
+    ])
+    columns = LocationRating.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[columns.location_id],
+        set_={
+            **{key: columns[key] + stmt.excluded[key] for key in keys},
+            "score": ranking.score(
+                columns.weighted_rate_sum + stmt.excluded.weighted_rate_sum,
+                columns.weight_sum + stmt.excluded.weight_sum,
+                g
+            ),
+            "updated_at": func.now(),
+        }
+    )
+    await db.execute(stmt)
+
+    stats = LocationReviewStat.__table__.c
+    # Сортировка - одинаковый порядок блокировок строк у параллельных пачек
+    stmt = pg_insert(LocationReviewStat).values([
+        {"location_id": location_id, "kind": kind, "value": value, "count": count}
+        for (location_id, kind, value), count in sorted(stat_counts.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[stats.location_id, stats.kind, stats.value],
+        set_={"count": stats["count"] + stmt.excluded["count"], "updated_at": func.now()}
+    )
+    await db.execute(stmt)
+
+
+async def remove_review(db: AsyncSession, location_id: int, review):
+    """Убрать отзыв из агрегатов локации (строки распределений с нулём остаются)"""
+    deltas = _deltas(review, -1)
+    columns = LocationRating.__table__.c
+    stmt = (
+        update(LocationRating)
+        .where(LocationRating.location_id == location_id)
+        .values({
+            **{key: columns[key] + value for key, value in deltas.items()},
+            "score": ranking.score(
+                columns.weighted_rate_sum + deltas["weighted_rate_sum"],
+                columns.weight_sum + deltas["weight_sum"]
+            ),
+        })
+    )
+    await db.execute(stmt)
+
+    stats = LocationReviewStat.__table__.c
+    stmt = (
+        update(LocationReviewStat)
+        .where(
+            LocationReviewStat.location_id == location_id,
+            tuple_(LocationReviewStat.kind, LocationReviewStat.value).in_(_stat_keys(review))
+        )
+        .values({"count": stats["count"] - 1})
+    )
+    await db.execute(stmt)
+
+
+async def update_review(db: AsyncSession, location_id: int, old: ReviewValues, review):
+    """Изменённый отзыв: старые значения убрать, новые учесть (если что-то поменялось)"""
+    if ReviewValues.of(review) != old:
+        await remove_review(db, location_id, old)
+        await add_review(db, location_id, review)
+
+
+async def move_review(
+    db: AsyncSession,
+    old_location_id: Optional[int],
+    old: Optional[ReviewValues],
+    location_id: Optional[int],
+    review
+):
+    """Отзыв мог сменить локацию (правка в админке): убрать из старой, учесть в новой"""
+    if old is not None and old_location_id == location_id:
+        if location_id is not None:
+            await update_review(db, location_id, old, review)
+        return
+    if old is not None and old_location_id is not None:
+        await remove_review(db, old_location_id, old)
+    if location_id is not None:
+        await add_review(db, location_id, review)
+
+
+def median(distribution: List[tuple]) -> Optional[float]:
+    """Медиана по отсортированным парам (значение, сколько раз)"""
+    total = sum(count for _, count in distribution)
+    if not total:
+        return None
+    # Позиции (с нуля) одного или двух средних элементов
+    middle = {(total - 1) // 2, total // 2}
+    found, seen = [], 0
+    for value, count in distribution:
+        found += [value for position in middle if seen <= position < seen + count]
+        seen += count
+    return sum(found) / len(found)
+
+
+async def summary(db: AsyncSession, location_id: int) -> Optional[dict]:
+    """Сводка отзывов локации из готовых агрегатов; None - агрегатов ещё нет"""
+    rating = await db.get(LocationRating, location_id)
+    if rating is None:
+        return None
+    result = await db.execute(
+        select(LocationReviewStat.kind, LocationReviewStat.value, LocationReviewStat.count)
+        .where(LocationReviewStat.location_id == location_id, LocationReviewStat.count > 0)
+        .order_by(LocationReviewStat.kind, LocationReviewStat.value)
+    )
+    distributions = {kind: [] for kind in STAT_KINDS}
+    for kind, value, count in result.all():
+        distributions[kind].append((value, count))
+
+    return {
+        "location_id": location_id,
+        "review_count": rating.review_count,
+        "avg_rate": rating.avg_rate,
+        "rate_histogram": rating.rate_histogram,
+        "pollution": [{"id": v, "count": c} for v, c in distributions["pollution"]],
+        "condition": [{"id": v, "count": c} for v, c in distributions["condition"]],
+        "material": [{"id": v, "count": c} for v, c in distributions["material"]],
+        "median_seating_positions": median(distributions["seating"]),
+    }
+
+
+async def rebuild_all(db: AsyncSession):
+    """Полная пересборка агрегатов по всем отзывам (разовая задача)"""
+    await db.execute(delete(LocationRating))
+    await db.execute(delete(LocationReviewStat))
+
+    # Отзывы удалённых локаций (location_id IS NULL) не учитываются
+    located = Review.location_id.is_not(None)
+    weight = ranking.weight_sql(Review.created_at)
+    aggregates = (
+        select(
+            Review.location_id,
+            func.count(Review.id),
+            func.sum(Review.rate),
+            func.sum(Review.seating_positions),
+            func.sum(weight),
+            func.sum(weight * Review.rate),
+            *[func.count(case((Review.rate == rate, 1))) for rate in RATE_COLUMNS],
+        )
+        .where(located)
+        .group_by(Review.location_id)
+    )
+    stmt = insert(LocationRating).from_select(
+        [
+            "location_id", "review_count", "rating_sum", "seating_sum",
+            "weight_sum", "weighted_rate_sum", *RATE_COLUMNS.values()
+        ],
+        aggregates
+    )
+    await db.execute(stmt)
+
+    distributions = union_all(*[
+        select(Review.location_id, literal(kind), getattr(Review, field), func.count(Review.id))
+        .where(located)
+        .group_by(Review.location_id, getattr(Review, field))
+        for kind, field in STAT_KINDS.items()
+    ])
+    await db.execute(
+        insert(LocationReviewStat).from_select(["location_id", "kind", "value", "count"], distributions)
+    )
+    await db.commit()
+    # score и ячейки рейтинга (коммитит пачками)
+    await ranking.refresh_scores(db)
@@ -0,0 +1,45 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
+
+# Через сколько секунд перечитать справочник, даже если его никто не сбрасывал
+# (админка сбрасывает кэш только в своём воркере)
+DEFAULT_TTL = 60.0
+
+
+class TtlRegistry(Generic[T]):
+    """
+    Небольшой справочник из БД в памяти процесса (статусы, справочники отзывов).
+    Перечитывается по TTL или после invalidate(); одновременные запросы
+    после истечения ждут одну загрузку, а не читают базу каждый сам.
+    """
+
+    def __init__(self, loader: Callable[[AsyncSession], Awaitable[T]], ttl: float = DEFAULT_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self._value: Optional[T] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def load(self, db: AsyncSession) -> T:
+        self._value = await self.loader(db)
+        self._loaded_at = time.monotonic()
+        return self._value
+
+    def invalidate(self):
+        self._value = None
+
+    def _stale(self) -> bool:
+        return self._value is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def get(self, db: AsyncSession) -> T:
+        if self._stale():
+            async with self._lock:
+                # Пока ждали блокировку, справочник мог загрузить другой запрос
+                if self._stale():
+                    await self.load(db)
+        return self._value
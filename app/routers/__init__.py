@@ -3,4 +3,5 @@ from .locations import locations_router
 from .review import reviews_router
 from .dictionaries import dict_router
 from .pictures import pictures_router
-from .users import users_router
\ No newline at end of file
+from .users import users_router
+from .sync import sync_router
\ No newline at end of file
@@ -8,6 +8,7 @@ from app.database import get_db
 from app.map.models import TypeOfSeat, Status, Pollution, Condition, Material, User
 from app.pyd import schemas
 from app.security import get_current_admin
+from app.dicts import review_dictionaries
 
 dict_router = APIRouter(prefix="/dicts", tags=["Dictionaries"])
 
@@ -65,6 +66,7 @@ async def create_material(
     new_item = Material(name=item.name)
     db.add(new_item)
     await db.commit()
+    review_dictionaries.invalidate()
     await db.refresh(new_item)
     return new_item
 
@@ -77,6 +79,7 @@ async def create_condition(
     new_item = Condition(name=item.name)
     db.add(new_item)
     await db.commit()
+    review_dictionaries.invalidate()
     await db.refresh(new_item)
     return new_item
 
@@ -89,6 +92,7 @@ async def create_pollution(
     new_item = Pollution(name=item.name)
     db.add(new_item)
     await db.commit()
+    review_dictionaries.invalidate()
     await db.refresh(new_item)
     return new_item
 
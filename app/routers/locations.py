@@ -1,20 +1,211 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File
+from fastapi.responses import JSONResponse
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, or_, union_all, literal
 from typing import List, Optional
 from decimal import Decimal
 from app.database import get_db
-from app.pyd.schemas import LocationSeatCreate, LocationSeatBase,LocationSeatResponse,LocationSeatUpdate
+from app.pyd.schemas import LocationSeatCreate, LocationSeatBase,LocationSeatResponse,LocationSeatUpdate,MapCluster,LocationPin,LocationNearby,CacheStats,ImportReport,LocationSearchResult,LocationSuggestion,LocationTopRated
 from app.pyd.base_models import LocationSeatBase
 from app.security import get_current_user
-from app.map.models import User,LocationSeat,Review,LocationSeatOfReview
+from app.map.models import User,LocationSeat,Review,LocationRating
 from sqlalchemy.orm import selectinload
-from app.map.models import Status
+from app.statuses import status_registry
 from app.security import get_current_user_or_none
+from app import geo
+from app.clusters import cluster_index, MAX_CLUSTER_ZOOM, MAX_CLUSTERS
+from app.suggest import suggest_index
+from app.pagination import encode_cursor, decode_cursor, set_next_cursor, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from app.cache import bbox_cache, MAX_ROWS_PER_ENTRY
+from app import ratings
+from app import ranking
+from app import changes
+from app.etags import etag_matches, not_modified
+from app import packed
+from app.streaming import wants_ndjson, ndjson_rows, ndjson_response
+from fastapi.responses import StreamingResponse
+from app.config import settings
+from app import importer
+from app import exporter
+from app.fieldsets import LocationView, location_view, DEFAULT_VIEW
+import difflib
+import io
+import re
 
 
 locations_router = APIRouter(prefix="/locations", tags=["Locations"])
+
+# Сколько локаций максимум за один GET /locations/batch
+MAX_BATCH_IDS = 100
+
+
+async def get_public_status_ids(db: AsyncSession) -> frozenset:
+    """id статусов, с которыми локация видна всем (из кэша справочника)"""
+    return await status_registry.public_ids(db)
+
+
+def parse_bbox(bbox: str):
+    """'min_lon,min_lat,max_lon,max_lat' -> (min_lat, min_lon, max_lat, max_lon)"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (Decimal(v) for v in bbox.split(","))
+    except Exception:
+        raise HTTPException(status_code=422, detail="bbox должен быть вида min_lon,min_lat,max_lon,max_lat")
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=422, detail="bbox: минимум больше максимума")
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def in_bbox(min_lat, max_lat, min_lon, max_lon):
+    """Условия bbox: сначала ячейки geohash (по индексу), потом точные координаты"""
+    return (
+        geo.bbox_clause(LocationSeat.geohash, min_lat, max_lat, min_lon, max_lon),
+        LocationSeat.cord_x >= min_lat,
+        LocationSeat.cord_x <= max_lat,
+        LocationSeat.cord_y >= min_lon,
+        LocationSeat.cord_y <= max_lon
+    )
+
+
+async def filter_locations(
+    db: AsyncSession,
+    query,
+    current_user: Optional[User],
+    min_lat: Optional[Decimal] = None,
+    max_lat: Optional[Decimal] = None,
+    min_lon: Optional[Decimal] = None,
+    max_lon: Optional[Decimal] = None,
+    type_id: Optional[int] = None,
+    status_id: Optional[int] = None,
+):
+    """Общие фильтры списка локаций: видимость по статусу, bbox, тип"""
+    is_admin = False
+    if current_user:
+
+        if current_user.role_id == 1:
+            is_admin = True
+    
+    if not is_admin:
+
+        query = query.where(LocationSeat.status.in_(await get_public_status_ids(db)))
+
+
+    if status_id:
+        query = query.where(LocationSeat.status == status_id)
+
+    # Гео-фильтры
+    if min_lat and max_lat and min_lon and max_lon:
+        query = query.where(*in_bbox(min_lat, max_lat, min_lon, max_lon))
+
+
+    if type_id:
+        query = query.where(LocationSeat.type == type_id)
+
+    return query
+
+
+async def visibility_clause(db: AsyncSession, current_user: Optional[User]):
+    """Та же видимость, что у карточки локации: публичный статус, автор или админ (None - без ограничений)"""
+    if current_user is not None and current_user.role_id == 1:
+        return None
+    public = LocationSeat.status.in_(await get_public_status_ids(db))
+    if current_user is None:
+        return public
+    return or_(public, LocationSeat.author_id == current_user.id)
+
+
+def parse_ids(ids: str, limit: int) -> List[int]:
+    """'3,1,2' -> [3, 1, 2] без повторов, порядок сохраняется"""
+    try:
+        values = [int(v) for v in ids.split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids должен быть списком чисел через запятую")
+    values = list(dict.fromkeys(values))
+    if not values:
+        raise HTTPException(status_code=422, detail="ids не может быть пустым")
+    if len(values) > limit:
+        raise HTTPException(status_code=422, detail=f"Не больше {limit} id за запрос")
+    return values
+
+
+def normalize_name(name: str) -> str:
+    name = name.lower().replace("ё", "е")
+    return " ".join(re.findall(r"\w+", name))
+
+
+def name_similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, normalize_name(a), normalize_name(b)).ratio()
+
+
+async def find_duplicates(
+    db: AsyncSession, cord_x: Decimal, cord_y: Decimal, name: str, current_user: Optional[User]
+) -> List[dict]:
+    """
+    Возможные дубликаты: локации в радиусе DUPLICATE_RADIUS_M с похожим названием
+    (или с точно такими же координатами). Ищем по соседним ячейкам geohash,
+    поэтому читаем только соседей, а не всю таблицу.
+    visible - видна ли локация пользователю (правило карточки локации).
+    """
+    radius_m = settings.DUPLICATE_RADIUS_M
+    cells = geo.neighbourhood_cells(cord_x, cord_y, radius_m)
+    visible = await visibility_clause(db, current_user)
+    query = (
+        pin_query()
+        .add_columns((visible if visible is not None else literal(True)).label("visible"))
+        .where(geo.ranges_clause(LocationSeat.geohash, geo.cell_ranges(cells)))
+    )
+    result = await db.execute(query)
+
+    candidates = []
+    for row in result.all():
+        if row.cord_x == cord_x and row.cord_y == cord_y:
+            distance = 0.0
+        else:
+            distance = geo.haversine_m(cord_x, cord_y, row.cord_x, row.cord_y)
+            if distance > radius_m:
+                continue
+            if name_similarity(name, row.name) < settings.DUPLICATE_NAME_SIMILARITY:
+                continue
+        candidates.append({**row._asdict(), "distance_m": distance})
+
+    candidates.sort(key=lambda c: c["distance_m"])
+    return candidates
+
+
+def paginate_by_id(query, limit: Optional[int], cursor: Optional[str]):
+    """Keyset-пагинация по id: следующая страница - это id > последнего, без OFFSET"""
+    if cursor:
+        (last_id,) = decode_cursor(cursor, int)
+        query = query.where(LocationSeat.id > last_id)
+    query = query.order_by(LocationSeat.id)
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def next_id_cursor(rows, limit: Optional[int]) -> Optional[str]:
+    if limit and len(rows) == limit:
+        return encode_cursor(rows[-1].id)
+    return None
+
+
+def pin_query():
+    """Только колонки для маркеров: без ORM-объектов и подгрузки связей"""
+    return (
+        select(
+            LocationSeat.id,
+            LocationSeat.name,
+            LocationSeat.cord_x,
+            LocationSeat.cord_y,
+            LocationSeat.type,
+            LocationSeat.status,
+            (LocationRating.rating_sum / func.nullif(LocationRating.review_count, 0)).label("avg_rate"),
+            func.coalesce(LocationRating.review_count, 0).label("review_count")
+        )
+        # Агрегаты берём из Location_ratings, отзывы не трогаем
+        .outerjoin(LocationRating, LocationRating.location_id == LocationSeat.id)
+    )
+
 # cоздать локацию
 @locations_router.post("/", response_model=LocationSeatResponse, status_code=status.HTTP_201_CREATED)
 async def create_location(
@@ -23,17 +214,21 @@ async def create_location(
     current_user: User = Depends(get_current_user)
 ):
     # --- 1. ПРОВЕРКА НА ДУБЛИКАТЫ (В самом начале) ---
-    stmt = select(LocationSeat).where(
-        LocationSeat.cord_x == location_data.cord_x,
-        LocationSeat.cord_y == location_data.cord_y
+    # Та же точка или похожее название в нескольких метрах - отдаём кандидатов в 409
+    candidates = await find_duplicates(
+        db, location_data.cord_x, location_data.cord_y, location_data.name, current_user
     )
-    result = await db.execute(stmt)
-    existing_location = result.scalars().first()
 
-    if existing_location:
+    if candidates:
+        # Скрытые от пользователя локации тоже не дают создать дубликат, но без подробностей
+        visible = [c for c in candidates if c.pop("visible")]
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, 
-            detail="Локация с такими координатами уже существует"
+            detail={
+                "message": "Похожая локация рядом уже существует",
+                "candidates": [LocationNearby(**c).model_dump(mode="json") for c in visible],
+                "hidden_candidates": len(candidates) - len(visible)
+            }
         )
 
     # --- 2. СОЗДАНИЕ ЛОКАЦИИ (Переменная new_location появляется здесь) ---
@@ -51,6 +246,7 @@ async def create_location(
     
     # Важно: flush присваивает ID новой локации
     await db.flush() 
+    await changes.record_change(db, changes.LOCATION, new_location.id, location_id=new_location.id)
 
     # --- 3. ОБРАБОТКА ОТЗЫВА (Если есть) ---
     if location_data.first_review:
@@ -62,20 +258,21 @@ async def create_location(
             condition_id=review_in.condition_id,
             material_id=review_in.material_id,
             seating_positions=review_in.seating_positions,
+            location_id=new_location.id,
             author_id=current_user.id,
             created_at=datetime.utcnow()
         )
         db.add(new_review)
         await db.flush() 
 
-        link = LocationSeatOfReview(
-            locations_id=new_location.id,
-            reviews_id=new_review.id
-        )
-        db.add(link)
+        await ratings.add_review(db, new_location.id, new_review)
+        await changes.record_change(db, changes.REVIEW, new_review.id, location_id=new_location.id)
 
     # Сохраняем всё в базу
     await db.commit()
+    cluster_index.upsert(new_location)
+    suggest_index.upsert(new_location)
+    await bbox_cache.invalidate_point(new_location.cord_x, new_location.cord_y)
     
     # --- 4. ПОДГОТОВКА ОТВЕТА (Строго В КОНЦЕ) ---
     # Мы используем new_location.id только тут, когда он уже точно существует
@@ -85,10 +282,11 @@ async def create_location(
             # Подгружаем цепочку: Отзывы -> Авторы отзывов -> Локация отзыва
             selectinload(LocationSeat.reviews).options(
                 selectinload(Review.author),
-                selectinload(Review.location_links)
+                selectinload(Review.location)
             ),
             selectinload(LocationSeat.pictures),
-            selectinload(LocationSeat.status_ref)   
+            selectinload(LocationSeat.status_ref),
+            selectinload(LocationSeat.rating)
         )
         .where(LocationSeat.id == new_location.id)
     )
@@ -99,8 +297,14 @@ async def create_location(
     
 
 # получить все локации
-@locations_router.get("/", response_model=List[LocationSeatResponse])
+@locations_router.get(
+    "/",
+    response_model=List[LocationSeatResponse],
+    responses={200: {"content": {"application/x-ndjson": {}}}}
+)
 async def get_locations(
+    request: Request,
+    response: Response,
     min_lat: Optional[Decimal] = None,
     max_lat: Optional[Decimal] = None,
     min_lon: Optional[Decimal] = None,
@@ -108,57 +312,440 @@ async def get_locations(
 
     type_id: Optional[int] = None,
     status_id: Optional[int] = None, 
-    
+
+    # Пагинация (необязательная): курсор следующей страницы приходит в заголовке X-Next-Cursor
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+
+    # Выборочные поля и связи: ?fields=name,cord_x,cord_y&expand=reviews
+    view: LocationView = Depends(location_view),
 
     current_user: Optional[User] = Depends(get_current_user_or_none),
     db: AsyncSession = Depends(get_db)
 ):
-    
-    query = select(LocationSeat).options(
+    # Окно карты: сначала пробуем кэш по ячейкам сетки (NDJSON-выгрузку не кэшируем)
+    if min_lat and max_lat and min_lon and max_lon and not wants_ndjson(request):
+        snapped = bbox_cache.snap(min_lat, max_lat, min_lon, max_lon)
+        if snapped is not None:
+            rows = await load_bbox_entry(db, current_user, *snapped, type_id=type_id, status_id=status_id)
+            if rows is not None:
+                return cached_locations_page(request, rows, min_lat, max_lat, min_lon, max_lon, limit, cursor, view)
+
+    query = await filter_locations(
+        db, location_list_query(view), current_user,
+        min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon,
+        type_id=type_id, status_id=status_id
+    )
+    query = paginate_by_id(query, limit, cursor)
+
+    # Accept: application/x-ndjson - отдаём построчно с серверного курсора,
+    # не собирая весь список в памяти
+    if wants_ndjson(request):
+        if view.reviews_limit:
+            raise HTTPException(status_code=422, detail="reviews_limit не поддерживается для NDJSON")
+        return ndjson_response(ndjson_rows(query, view.model))
+
+    # ETag по (id, version) всех строк выборки: при совпадении отвечаем 304
+    # без подгрузки отзывов/фото и без сериализации
+    versions_query = query.with_only_columns(LocationSeat.id, LocationSeat.version)
+    versions = (await db.execute(versions_query)).all()
+    etag = view.etag("locations", [tuple(v) for v in versions])
+    next_cursor = next_id_cursor(versions, limit)
+    headers = {"Vary": "Authorization"}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if etag_matches(request, etag):
+        return not_modified(etag, headers)
 
-        selectinload(LocationSeat.reviews).options(
-            selectinload(Review.author),
-            selectinload(Review.location_links).selectinload(LocationSeatOfReview.location) 
-        ),
-        
-        selectinload(LocationSeat.pictures),
-        selectinload(LocationSeat.status_ref)
+    result = await db.execute(query)
+    locations = await view.attach(db, result.scalars().all())
+    if not view.is_default:
+        return view.render(locations, {"ETag": etag, **headers})
+    response.headers.update({"ETag": etag, **headers})
+    return locations
+
+
+def location_list_query(view: LocationView = DEFAULT_VIEW):
+    """Локации со всем, что нужно для ответа (по умолчанию - LocationSeatResponse целиком)"""
+    return select(LocationSeat).options(*view.options())
+
+
+async def load_bbox_entry(
+    db: AsyncSession,
+    current_user: Optional[User],
+    cells: List[str],
+    bounds: tuple,
+    type_id: Optional[int] = None,
+    status_id: Optional[int] = None,
+) -> Optional[List[dict]]:
+    """
+    Сериализованные локации расширенного bbox из кэша или из БД (с сохранением в кэш).
+    None - в области слишком много локаций, пусть отвечает обычный запрос.
+    """
+    is_admin = current_user is not None and current_user.role_id == 1
+    key = bbox_cache.make_key(cells, admin=is_admin, type=type_id, status=status_id)
+    rows = await bbox_cache.get(key)
+    if rows is not None:
+        return rows
+
+    epoch = bbox_cache.epoch
+    ids_query = await filter_locations(
+        db, select(LocationSeat.id), current_user, type_id=type_id, status_id=status_id
     )
+    ids_query = ids_query.where(*in_bbox(*bounds)).order_by(LocationSeat.id).limit(MAX_ROWS_PER_ENTRY + 1)
+    ids = (await db.execute(ids_query)).scalars().all()
+    if len(ids) > MAX_ROWS_PER_ENTRY:
+        return None
+
+    rows = []
+    if ids:
+        result = await db.execute(
+            location_list_query().where(LocationSeat.id.in_(ids)).order_by(LocationSeat.id)
+        )
+        rows = [
+            {"version": loc.version, "data": LocationSeatResponse.model_validate(loc).model_dump(mode="json")}
+            for loc in result.scalars().all()
+        ]
+    await bbox_cache.put(key, rows, cells, epoch)
+    return rows
 
 
-    is_admin = False
-    if current_user:
+def cached_locations_page(
+    request: Request, rows: List[dict], min_lat, max_lat, min_lon, max_lon, limit, cursor,
+    view: LocationView = DEFAULT_VIEW
+):
+    """Точный bbox, курсор и limit поверх записи кэша; ETag такой же, как у запроса в БД"""
+    page = [
+        r for r in rows
+        if min_lat <= Decimal(str(r["data"]["cord_x"])) <= max_lat
+        and min_lon <= Decimal(str(r["data"]["cord_y"])) <= max_lon
+    ]
+    if cursor:
+        (last_id,) = decode_cursor(cursor, int)
+        page = [r for r in page if r["data"]["id"] > last_id]
+    if limit:
+        page = page[:limit]
+
+    etag = view.etag("locations", [(r["data"]["id"], r["version"]) for r in page])
+    headers = {"Vary": "Authorization"}
+    if limit and len(page) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(page[-1]["data"]["id"])
+    if etag_matches(request, etag):
+        return not_modified(etag, headers)
+    return JSONResponse(content=[view.project(r["data"]) for r in page], headers={"ETag": etag, **headers})
+
+
+# массовый импорт из CSV / GeoJSON (только админ)
+@locations_router.post("/import", response_model=ImportReport)
+async def import_locations(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|geojson)$", description="По умолчанию - по расширению файла"),
+    default_status: Optional[str] = Query(None, description="Статус (id или название) для строк без статуса"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Потоковый разбор файла, вставка пачками; в ответе - ошибки по строкам и скорость"""
+    if current_user.role_id != 1:
+        raise HTTPException(status_code=403, detail="У вас нет прав администратора")
 
-        if current_user.role_id == 1:
-            is_admin = True
-    
-    if is_admin:
-   
-        pass 
-    else:
+    try:
+        fmt = format or importer.detect_format(file.filename)
+    except importer.ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        job = importer.LocationImporter(db, current_user.id, default_status=default_status)
+        return await job.run(importer.read_records(text, fmt))
+    finally:
+        text.detach()
+
+# потоковая выгрузка в GeoJSON / CSV (только админ)
+@locations_router.get(
+    "/export",
+    responses={200: {"content": {exporter.MEDIA_TYPES["geojson"]: {}, "text/csv": {}}}}
+)
+async def export_locations(
+    format: str = Query("geojson", pattern="^(geojson|csv)$"),
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    type_id: Optional[int] = None,
+    status_id: Optional[int] = None,
+    with_ratings: bool = Query(False, alias="ratings", description="Добавить агрегаты отзывов"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Полная выгрузка с серверного курсора: память не зависит от размера таблицы"""
+    if current_user.role_id != 1:
+        raise HTTPException(status_code=403, detail="У вас нет прав администратора")
 
-        query = query.join(Status, LocationSeat.status == Status.id)
-        query = query.where(Status.name.in_(["Активно", "На ремонте"]))
+    query = exporter.export_query(with_ratings=with_ratings)
+    if bbox:
+        min_lat, min_lon, max_lat, max_lon = parse_bbox(bbox)
+        query = query.where(*in_bbox(min_lat, max_lat, min_lon, max_lon))
+    query = await filter_locations(db, query, current_user, type_id=type_id, status_id=status_id)
+
+    rows = exporter.geojson_rows if format == "geojson" else exporter.csv_rows
+    filename = f"locations.{format}"
+    return StreamingResponse(
+        rows(query, with_ratings=with_ratings),
+        media_type=exporter.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
+# статистика кэша окон карты (только админ)
+@locations_router.get("/cache/stats", response_model=CacheStats)
+async def get_cache_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role_id != 1:
+        raise HTTPException(status_code=403, detail="У вас нет прав администратора")
+    return bbox_cache.stats()
+
+# маркеры для карты (только нужные колонки)
+@locations_router.get(
+    "/pins",
+    response_model=List[LocationPin],
+    responses={200: {"content": {packed.MSGPACK_MEDIA_TYPE: {}}}}
+)
+async def get_location_pins(
+    request: Request,
+    min_lat: Optional[Decimal] = None,
+    max_lat: Optional[Decimal] = None,
+    min_lon: Optional[Decimal] = None,
+    max_lon: Optional[Decimal] = None,
 
-    if status_id:
-        query = query.where(LocationSeat.status == status_id)
+    type_id: Optional[int] = None,
+    status_id: Optional[int] = None,
 
-    # 5. Гео-фильтры
-    if min_lat and max_lat and min_lon and max_lon:
-        query = query.where(
-            LocationSeat.cord_x >= min_lat,
-            LocationSeat.cord_x <= max_lat,
-            LocationSeat.cord_y >= min_lon,
-            LocationSeat.cord_y <= max_lon
+    current_user: Optional[User] = Depends(get_current_user_or_none),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Те же фильтры, что у GET /locations/, но одним запросом и без вложенных данных.
+    С Accept: application/x-msgpack ответ приходит колонками (см. app/packed.py).
+    """
+    query = await filter_locations(
+        db, pin_query(), current_user,
+        min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon,
+        type_id=type_id, status_id=status_id
+    )
+    result = await db.execute(query)
+    pins = [row._asdict() for row in result.all()]
+
+    if packed.wants_msgpack(request):
+        return Response(content=packed.pack_pins(pins), media_type=packed.MSGPACK_MEDIA_TYPE)
+    return pins
+
+# ближайшие локации к точке
+@locations_router.get("/nearby", response_model=List[LocationNearby])
+async def get_nearby_locations(
+    lat: Decimal = Query(..., ge=-90, le=90, description="Широта"),
+    lon: Decimal = Query(..., ge=-180, le=180, description="Долгота"),
+    radius_m: float = Query(1000, gt=0, le=50_000),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Optional[User] = Depends(get_current_user_or_none),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    k ближайших видимых локаций в радиусе, по возрастанию расстояния.
+    Ищем кольцами ячеек geohash вокруг точки и останавливаемся, как только
+    в гарантированно просмотренном радиусе набралось limit локаций.
+    """
+    precision = geo.precision_for_radius(radius_m, lat)
+
+    found = []
+    ring = 0
+    while True:
+        cells = geo.ring_cells(lat, lon, precision, ring)
+        query = (await filter_locations(db, pin_query(), current_user)).where(
+            geo.ranges_clause(LocationSeat.geohash, geo.cell_ranges(cells))
         )
+        result = await db.execute(query)
+        for row in result.all():
+            distance = geo.haversine_m(lat, lon, row.cord_x, row.cord_y)
+            if distance <= radius_m:
+                found.append({**row._asdict(), "distance_m": distance})
+
+        covered = geo.ring_radius_m(lat, precision, ring)
+        if covered >= radius_m or sum(1 for f in found if f["distance_m"] <= covered) >= limit:
+            break
+        ring += 1
+
+    found.sort(key=lambda f: f["distance_m"])
+    return found[:limit]
+
+# лучшие локации в области (по байесовской оценке)
+@locations_router.get("/top", response_model=List[LocationTopRated])
+async def get_top_locations(
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    lat: Optional[Decimal] = Query(None, ge=-90, le=90, description="Широта (вместо bbox)"),
+    lon: Optional[Decimal] = Query(None, ge=-180, le=180, description="Долгота (вместо bbox)"),
+    radius_m: float = Query(2000, gt=0, le=50_000),
+    type_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Optional[User] = Depends(get_current_user_or_none),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    top K по score из Location_ratings (см. app/ranking.py) в bbox или в радиусе от точки.
+    По каждой ячейке рейтинга берём K лучших прямо из индекса (cell, score),
+    потом сливаем и отрезаем K.
+    """
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = parse_bbox(bbox)
+    elif lat is not None and lon is not None:
+        min_lat, max_lat, min_lon, max_lon = geo.radius_bbox(lat, lon, radius_m)
+    else:
+        raise HTTPException(status_code=422, detail="Нужен bbox или lat и lon")
+
+    base = pin_query().add_columns(LocationRating.score).where(
+        LocationRating.score.is_not(None),
+        LocationSeat.cord_x >= min_lat,
+        LocationSeat.cord_x <= max_lat,
+        LocationSeat.cord_y >= min_lon,
+        LocationSeat.cord_y <= max_lon
+    )
+    if bbox is None:
+        base = base.where(geo.haversine_sql(LocationSeat.cord_x, LocationSeat.cord_y, lat, lon) <= radius_m)
+    base = await filter_locations(db, base, current_user, type_id=type_id)
 
+    ranges = ranking.cell_ranges(min_lat, max_lat, min_lon, max_lon)
+    if ranges is None:
+        parts = [base]
+    else:
+        parts = [
+            base.where(LocationRating.cell == lo if lo == hi else geo.ranges_clause(LocationRating.cell, [(lo, hi)]))
+            for lo, hi in ranges
+        ]
+    parts = [part.order_by(LocationRating.score.desc(), LocationSeat.id).limit(limit) for part in parts]
+    query = parts[0] if len(parts) == 1 else union_all(*parts)
 
-    if type_id:
-        query = query.where(LocationSeat.type == type_id)
+    result = await db.execute(query)
+    rows = sorted((row._asdict() for row in result.all()), key=lambda r: (-r["score"], r["id"]))[:limit]
+    if bbox is None:
+        for row in rows:
+            row["distance_m"] = geo.haversine_m(lat, lon, row["cord_x"], row["cord_y"])
+    return rows
+
+# поиск по названию, адресу и описанию
+@locations_router.get("/search", response_model=List[LocationSearchResult])
+async def search_locations(
+    q: str = Query(..., min_length=2, max_length=200, description="Поисковый запрос"),
+    min_lat: Optional[Decimal] = None,
+    max_lat: Optional[Decimal] = None,
+    min_lon: Optional[Decimal] = None,
+    max_lon: Optional[Decimal] = None,
+    type_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: Optional[User] = Depends(get_current_user_or_none),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Полнотекстовый поиск с русской морфологией (tsvector, вес: название > адрес > описание)
+    плюс триграммы по названию и адресу, чтобы находить и с опечатками.
+    Фильтры bbox и типа - как у GET /locations/.
+    """
+    tsquery = func.websearch_to_tsquery("russian", q)
+    rank = (
+        func.ts_rank_cd(LocationSeat.search_vector, tsquery)
+        + func.greatest(func.word_similarity(q, LocationSeat.name), func.word_similarity(q, LocationSeat.address))
+    ).label("rank")
+
+    query = pin_query().add_columns(LocationSeat.address, rank).where(or_(
+        LocationSeat.search_vector.bool_op("@@")(tsquery),
+        # name %> q: слово из запроса похоже на часть названия (индекс gin_trgm_ops)
+        LocationSeat.name.bool_op("%>")(q),
+        LocationSeat.address.bool_op("%>")(q),
+    ))
+    query = await filter_locations(
+        db, query, current_user,
+        min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon,
+        type_id=type_id
+    )
+    query = query.order_by(rank.desc(), LocationSeat.id).limit(limit).offset(offset)
+
+    result = await db.execute(query)
+    return [row._asdict() for row in result.all()]
+
+# подсказки для строки поиска (из памяти, без запросов к локациям)
+@locations_router.get("/suggest", response_model=List[LocationSuggestion])
+async def suggest_locations(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: Optional[User] = Depends(get_current_user_or_none),
+    db: AsyncSession = Depends(get_db)
+):
+    is_admin = current_user is not None and current_user.role_id == 1
+    statuses = None if is_admin else await get_public_status_ids(db)
+    return suggest_index.suggest(prefix, limit, statuses)
+
+# несколько локаций по списку id (избранное)
+@locations_router.get("/batch", response_model=List[LocationSeatResponse])
+async def get_locations_batch(
+    ids: str = Query(..., description="id через запятую", examples=["12,5,40"]),
+    view: LocationView = Depends(location_view),
+    current_user: Optional[User] = Depends(get_current_user_or_none),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Одним набором IN-запросов вместо N вызовов GET /locations/{id}.
+    Несуществующие и скрытые от пользователя локации просто пропускаются;
+    порядок - как в ids.
+    """
+    location_ids = parse_ids(ids, MAX_BATCH_IDS)
+    query = location_list_query(view).where(LocationSeat.id.in_(location_ids))
+    clause = await visibility_clause(db, current_user)
+    if clause is not None:
+        query = query.where(clause)
+
+    result = await db.execute(query)
+    by_id = {location.id: location for location in result.scalars().all()}
+    locations = await view.attach(db, [by_id[i] for i in location_ids if i in by_id])
+    return locations if view.is_default else view.render(locations)
+
+# кластеры для карты
+@locations_router.get(
+    "/clusters",
+    response_model=List[MapCluster],
+    responses={200: {"content": {packed.MSGPACK_MEDIA_TYPE: {}}}}
+)
+async def get_location_clusters(
+    request: Request,
+    bbox: str = Query(..., description="min_lon,min_lat,max_lon,max_lat", examples=["59.88,57.87,60.05,57.97"]),
+    zoom: int = Query(..., ge=0, le=22),
+    current_user: Optional[User] = Depends(get_current_user_or_none),
+    db: AsyncSession = Depends(get_db)
+):
+    """Центры кластеров с количеством; на крупном зуме - отдельные точки"""
+    min_lat, min_lon, max_lat, max_lon = parse_bbox(bbox)
+
+    is_admin = current_user is not None and current_user.role_id == 1
+    statuses = None if is_admin else await get_public_status_ids(db)
+
+    if zoom <= MAX_CLUSTER_ZOOM:
+        clusters = cluster_index.query(min_lat, min_lon, max_lat, max_lon, zoom, statuses)
+    else:
+        clusters = await get_single_pins(db, min_lat, min_lon, max_lat, max_lon, statuses)
+
+    if packed.wants_msgpack(request):
+        return Response(content=packed.pack_clusters(clusters), media_type=packed.MSGPACK_MEDIA_TYPE)
+    return clusters
+
+
+async def get_single_pins(db: AsyncSession, min_lat, min_lon, max_lat, max_lon, statuses) -> List[dict]:
+    """Крупный зум: в кадре немного точек, берём их из базы по индексу geohash"""
+    query = (
+        select(LocationSeat.id, LocationSeat.cord_x, LocationSeat.cord_y)
+        .where(*in_bbox(min_lat, max_lat, min_lon, max_lon))
+        .limit(MAX_CLUSTERS)
+    )
+    if statuses is not None:
+        query = query.where(LocationSeat.status.in_(statuses))
 
     result = await db.execute(query)
-    return result.scalars().all()
+    return [
+        {"lat": float(row.cord_x), "lon": float(row.cord_y), "count": 1, "location_id": row.id}
+        for row in result.all()
+    ]
 
 # удалить локацию
 @locations_router.delete("/{location_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -183,75 +770,90 @@ async def delete_location(
 
 
     await db.delete(location)
+    # Отзывы и фото удалённой локации клиент убирает сам по tombstone локации
+    await changes.record_change(db, changes.LOCATION, location_id, changes.DELETE, location_id=location_id)
     await db.commit()
+    cluster_index.remove(location_id)
+    suggest_index.remove(location_id)
+    await bbox_cache.invalidate_point(location.cord_x, location.cord_y)
     
     return None
 # получить мои локации
-@locations_router.get("/my", response_model=List[LocationSeatResponse])
+@locations_router.get(
+    "/my",
+    response_model=List[LocationSeatResponse],
+    responses={200: {"content": {"application/x-ndjson": {}}}}
+)
 async def get_my_locations(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    # Для списка на экране достаточно ?fields=name,address,status,rating&limit=50
+    view: LocationView = Depends(location_view),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
 
-    stmt = (
-        select(LocationSeat)
-        .options(
+    stmt = location_list_query(view).where(LocationSeat.author_id == current_user.id)
+    stmt = paginate_by_id(stmt, limit, cursor)
 
-            selectinload(LocationSeat.reviews).options(
-                selectinload(Review.location_links), 
-                selectinload(Review.author)          
-            ),
-            
-   
-            selectinload(LocationSeat.pictures),
-            
+    # Accept: application/x-ndjson - выгрузка всей истории построчно с серверного курсора
+    if wants_ndjson(request):
+        if view.reviews_limit:
+            raise HTTPException(status_code=422, detail="reviews_limit не поддерживается для NDJSON")
+        return ndjson_response(ndjson_rows(stmt, view.model))
 
-            selectinload(LocationSeat.status_ref)
-        )
-        .where(LocationSeat.author_id == current_user.id)
-    )
     result = await db.execute(stmt)
-    return result.scalars().all()
+    locations = await view.attach(db, result.scalars().all())
+    next_cursor = next_id_cursor(locations, limit)
+    if not view.is_default:
+        return view.render(locations, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+    set_next_cursor(response, next_cursor)
+    return locations
 #Получить полную информацию о локации
 @locations_router.get("/{location_id}", response_model=LocationSeatResponse)
 async def get_location_detail(
     location_id: int,
+    request: Request,
+    response: Response,
+    view: LocationView = Depends(location_view),
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_or_none)
 ):
-    stmt = (
-        select(LocationSeat)
-        .options(
-            # Подгружаем всё необходимое для LocationSeatResponse + ReviewResponse
-            selectinload(LocationSeat.reviews).options(
-                selectinload(Review.location_links), # Для имени локации в отзыве (если надо)
-                selectinload(Review.author)          # Для имени автора отзыва
-            ),
-            selectinload(LocationSeat.pictures),
-            selectinload(LocationSeat.status_ref)
-        )
-        # --- ИСПРАВЛЕНИЕ ЗДЕСЬ ---
-        # Ищем конкретную локацию по её ID, а не все локации автора
+    # Сначала дешёвый запрос: версия и статус (без связей) - для прав и ETag
+    head_stmt = (
+        select(LocationSeat.author_id, LocationSeat.version, LocationSeat.status)
         .where(LocationSeat.id == location_id)
     )
-    result = await db.execute(stmt)
-    location = result.scalar_one_or_none()
+    head = (await db.execute(head_stmt)).one_or_none()
 
-    if not location:
+    if not head:
         raise HTTPException(status_code=404, detail="Такой локации не существует")
-    
-    # ... (дальше твоя логика проверки статусов, public_statuses и т.д.) ...
-    
-    # ПОВТОРЮ ЛОГИКУ ПРОВЕРКИ (на всякий случай):
-    public_statuses = ["Активно", "На ремонте"]
+
     is_admin = current_user and getattr(current_user, 'role_id', None) == 1
-    is_author = current_user and location.author_id == current_user.id
-    status_name = location.status_ref.name if location.status_ref else ""
+    is_author = current_user and head.author_id == current_user.id
 
-    if status_name not in public_statuses:
+    if not await status_registry.is_public(db, head.status):
         if not (is_admin or is_author):
             raise HTTPException(status_code=404, detail="Такой локации не существует")
-            
+
+    etag = view.etag("location", location_id, head.version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # Подгружаем только то, что попадёт в ответ (по умолчанию - LocationSeatResponse целиком)
+    stmt = location_list_query(view).where(LocationSeat.id == location_id)
+    result = await db.execute(stmt)
+    location = result.scalar_one_or_none()
+
+    if not location:
+        raise HTTPException(status_code=404, detail="Такой локации не существует")
+
+    await view.attach(db, [location])
+    if not view.is_default:
+        return view.render_one(location, {"ETag": etag})
+    response.headers["ETag"] = etag
     return location
 # обновить локацию
 @locations_router.patch("/{location_id}", response_model=LocationSeatResponse)
@@ -267,11 +869,12 @@ async def update_location(
         select(LocationSeat)
         .options(
             selectinload(LocationSeat.reviews).options(
-                selectinload(Review.location_links),
+                selectinload(Review.location),
                 selectinload(Review.author)
             ),
             selectinload(LocationSeat.pictures),
-            selectinload(LocationSeat.status_ref)
+            selectinload(LocationSeat.status_ref),
+            selectinload(LocationSeat.rating)
         )
         .where(LocationSeat.id == location_id) # Ищем просто по ID!
     )
@@ -290,11 +893,23 @@ async def update_location(
 
 
     update_data = location_update.model_dump(exclude_unset=True)
+    old_point = (location.cord_x, location.cord_y)
+    new_point = (update_data.get("cord_x", location.cord_x), update_data.get("cord_y", location.cord_y))
+    # Блокировки в том же порядке, что у записи отзыва: строка рейтинга,
+    # строка локации, журнал изменений (последним, см. changes.lock_change_log)
+    if new_point != old_point:
+        await ranking.update_cell(db, location.id, *new_point)
     
     for key, value in update_data.items():
         setattr(location, key, value)
+    await changes.record_change(db, changes.LOCATION, location.id, location_id=location.id)
 
     await db.commit()
     await db.refresh(location)
+    cluster_index.upsert(location)
+    suggest_index.upsert(location)
+    await bbox_cache.invalidate_point(*old_point)
+    if old_point != (location.cord_x, location.cord_y):
+        await bbox_cache.invalidate_point(location.cord_x, location.cord_y)
     
     return location
\ No newline at end of file
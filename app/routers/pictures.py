@@ -9,6 +9,8 @@ from app.security import get_current_user
 from typing import List
 from sqlalchemy import select
 from app.pyd import schemas
+from app import changes
+from app.cache import bbox_cache
 import os
 
 pictures_router = APIRouter(prefix="/pictures", tags=["Pictures"])
@@ -56,7 +58,10 @@ async def upload_photo(
     )
 
     db.add(new_picture)
+    await db.flush()
+    await changes.record_change(db, changes.PICTURE, new_picture.id, location_id=location.id)
     await db.commit()
+    await bbox_cache.invalidate_point(location.cord_x, location.cord_y)
     await db.refresh(new_picture)
 
     return new_picture
@@ -90,7 +95,9 @@ async def delete_picture(
 
 
     await db.delete(pic)
+    await changes.record_change(db, changes.PICTURE, picture_id, changes.DELETE, location_id=pic.location_id)
     await db.commit()
+    await bbox_cache.invalidate_location(db, pic.location_id)
     
     return None
 
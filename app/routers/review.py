@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, tuple_, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 from app.database import get_db
 from app.security import get_current_user
-from app.map.models import User, Review, LocationSeat, LocationSeatOfReview
+from app.map.models import User, Review, LocationSeat
 from app.pyd import schemas
+from app.pagination import encode_cursor, decode_cursor, set_next_cursor, MAX_PAGE_SIZE
+from app.streaming import wants_ndjson, ndjson_rows, ndjson_response
+from app import ratings
+from app import changes
+from app.etags import make_etag, etag_matches, not_modified
+from app.cache import bbox_cache
+from app.dicts import review_dictionaries
 
 
 reviews_router = APIRouter(prefix="/reviews", tags=["Reviews"])
@@ -34,6 +42,7 @@ async def create_review(
         condition_id=review_data.condition_id,
         material_id=review_data.material_id,
         seating_positions=review_data.seating_positions,
+        location_id=location.id,
         author_id=current_user.id,
         created_at=datetime.utcnow()
     )
@@ -41,14 +50,11 @@ async def create_review(
     db.add(new_review)
     await db.flush() 
 
-
-    new_link = LocationSeatOfReview(
-        locations_id=location.id,
-        reviews_id=new_review.id
-    )
-    db.add(new_link)
+    await ratings.add_review(db, location.id, new_review)
+    await changes.record_change(db, changes.REVIEW, new_review.id, location_id=location.id)
      
     await db.commit()
+    await bbox_cache.invalidate_point(location.cord_x, location.cord_y)
     
 
     stmt = (
@@ -57,74 +63,233 @@ async def create_review(
 
             selectinload(Review.author),
 
-            selectinload(Review.location_links).selectinload(LocationSeatOfReview.location)
+            selectinload(Review.location)
         )
         .where(Review.id == new_review.id)
     )
     
     result = await db.execute(stmt)
     full_review = result.scalar_one()
-
-
-    full_review.location_id = location.id
     
     return full_review
 
+# Итоги по отзывам пачки
+BATCH_CREATED = "created"
+BATCH_DUPLICATE = "duplicate"
+BATCH_ERROR = "error"
+
+
+def _batch_item_error(item: schemas.ReviewBatchItem, locations: dict, dictionaries: dict) -> Optional[str]:
+    if item.location_id not in locations:
+        return f"Локация {item.location_id} не найдена"
+    for field, ids in dictionaries.items():
+        if getattr(item, field) not in ids:
+            return f"{field}: нет такого значения в справочнике ({getattr(item, field)})"
+    return None
+
+
+#создать пачку обзоров (офлайн-очередь приложения)
+@reviews_router.post("/batch", response_model=List[schemas.ReviewBatchResult])
+async def create_reviews_batch(
+    batch: schemas.ReviewBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Вся пачка - одна транзакция: проверка по кэшу справочников и одному запросу
+    локаций, многострочный INSERT, агрегаты и журнал тоже пачкой.
+    Повторная отправка с теми же client_id возвращает прежние id (duplicate).
+    Итоги - в порядке отзывов в запросе.
+    """
+    items = batch.reviews
+    dictionaries = await review_dictionaries.ids(db)
+
+    result = await db.execute(
+        select(LocationSeat.id, LocationSeat.cord_x, LocationSeat.cord_y)
+        .where(LocationSeat.id.in_({item.location_id for item in items}))
+    )
+    locations = {row.id: row for row in result.all()}
+
+    existing_stmt = select(Review.client_id, Review.id).where(
+        Review.author_id == current_user.id,
+        Review.client_id.in_({item.client_id for item in items})
+    )
+    existing = dict((await db.execute(existing_stmt)).all())
+
+    results = {}
+    rows = []
+    now = datetime.utcnow()
+    for item in items:
+        # Повтор client_id внутри пачки получает тот же итог, что и первый
+        if item.client_id in results:
+            continue
+        if item.client_id in existing:
+            results[item.client_id] = schemas.ReviewBatchResult(
+                client_id=item.client_id, status=BATCH_DUPLICATE, id=existing[item.client_id]
+            )
+            continue
+        error = _batch_item_error(item, locations, dictionaries)
+        if error:
+            results[item.client_id] = schemas.ReviewBatchResult(
+                client_id=item.client_id, status=BATCH_ERROR, error=error
+            )
+            continue
+        rows.append({
+            **item.model_dump(include=set(ratings.ReviewValues._fields) | {"location_id", "client_id"}),
+            "author_id": current_user.id,
+            "created_at": now,
+        })
+        results[item.client_id] = None
+
+    if rows:
+        # Параллельная отправка той же пачки: конфликтующие строки пропускаются
+        stmt = (
+            pg_insert(Review)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=[Review.author_id, Review.client_id])
+            .returning(Review.id, Review.client_id, Review.location_id, *(
+                getattr(Review, field) for field in ratings.ReviewValues._fields
+            ))
+        )
+        created = (await db.execute(stmt)).all()
+
+        await ratings.add_reviews(db, [(r.location_id, r) for r in created])
+        await changes.bump_location_versions(db, (r.location_id for r in created))
+        await changes.record_changes(db, changes.REVIEW, [(r.id, r.location_id) for r in created])
+        await db.commit()
+
+        for r in created:
+            results[r.client_id] = schemas.ReviewBatchResult(client_id=r.client_id, status=BATCH_CREATED, id=r.id)
+        for location_id in {r.location_id for r in created}:
+            await bbox_cache.invalidate_point(locations[location_id].cord_x, locations[location_id].cord_y)
+
+        # Не вставились из-за параллельного запроса - отдаём id, созданные им
+        lost = [client_id for client_id, item_result in results.items() if item_result is None]
+        if lost:
+            existing = dict((await db.execute(existing_stmt)).all())
+            for client_id in lost:
+                results[client_id] = schemas.ReviewBatchResult(
+                    client_id=client_id, status=BATCH_DUPLICATE, id=existing.get(client_id)
+                )
+
+    return [results[item.client_id] for item in items]
+
+
 #вывести все обзоры по локации с пагинацией
 @reviews_router.get("/location/{location_id}", response_model=List[schemas.ReviewResponse])
 async def get_location_reviews(
     location_id: int,
-    limit: int = 10, 
+    request: Request,
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
     offset: int = 0,  
+    # Курсор следующей страницы приходит в заголовке X-Next-Cursor (offset тогда не нужен)
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
+    # Любой отзыв локации увеличивает её версию: версия + параметры страницы = ETag
+    version = await db.scalar(select(LocationSeat.version).where(LocationSeat.id == location_id))
+    etag = None
+    if version is not None:
+        etag = make_etag("location_reviews", location_id, version, limit, offset, cursor)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
     stmt = (
         select(Review)
         .options(
             # Загружаем автора (для author_username)
             selectinload(Review.author),
-            # Загружаем связь -> локацию (для location_name)
-            selectinload(Review.location_links).selectinload(LocationSeatOfReview.location)
+            # Загружаем локацию (для location_name)
+            selectinload(Review.location)
         )
-        .join(LocationSeatOfReview, Review.id == LocationSeatOfReview.reviews_id)
-        .where(LocationSeatOfReview.locations_id == location_id)
-        .order_by(Review.created_at.desc())
+        .where(Review.location_id == location_id)
+        .order_by(Review.created_at.desc(), Review.id.desc())
         .limit(limit)
-        .offset(offset)
     )
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor, datetime, int)
+        stmt = stmt.where(tuple_(Review.created_at, Review.id) < tuple_(last_created_at, last_id))
+    else:
+        stmt = stmt.offset(offset)
+
     result = await db.execute(stmt)
     reviews = result.scalars().all()
-    
-    # Проставляем ID локации вручную (так как его нет в таблице Reviews)
-    for r in reviews:
-        r.location_id = location_id
+
+    if len(reviews) == limit:
+        set_next_cursor(response, encode_cursor(reviews[-1].created_at, reviews[-1].id))
+    if etag is not None:
+        response.headers["ETag"] = etag
         
     return reviews
 
 
+#сводка по обзорам локации (гистограмма оценок и распределения) без загрузки самих отзывов
+@reviews_router.get("/location/{location_id}/summary", response_model=schemas.ReviewSummaryResponse)
+async def get_location_reviews_summary(
+    location_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    summary = await ratings.summary(db, location_id)
+    if summary is not None:
+        return summary
+
+    # Агрегатов нет - либо отзывов ещё не было, либо нет самой локации
+    exists = await db.scalar(select(LocationSeat.id).where(LocationSeat.id == location_id))
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Такой локации не существует")
+    return schemas.ReviewSummaryResponse(location_id=location_id)
+
+
 #вывести все обзоры пользователя
-@reviews_router.get("/user/my", response_model=List[schemas.ReviewResponse])
+@reviews_router.get(
+    "/user/my",
+    response_model=List[schemas.ReviewListItem],
+    responses={200: {"content": {"application/x-ndjson": {}}}}
+)
 async def get_my_reviews(
+    request: Request,
+    response: Response,
+    # Как у /locations/my: страница limit, курсор следующей - в X-Next-Cursor; без limit - все
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    stmt = my_reviews_query(current_user, cursor, limit)
+
+    # Accept: application/x-ndjson - вся история построчно с серверного курсора
+    if wants_ndjson(request):
+        return ndjson_response(ndjson_rows(stmt, schemas.ReviewListItem, scalars=False))
+
+    rows = (await db.execute(stmt)).all()
+    if limit and len(rows) == limit:
+        set_next_cursor(response, encode_cursor(rows[-1].created_at, rows[-1].id))
+    return [row._asdict() for row in rows]
+
+
+def my_reviews_query(author: User, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """Колонки списка "мои отзывы", новые сверху; keyset по (created_at, id)"""
     stmt = (
-        select(Review)
-        .options(
-            selectinload(Review.author),
-            selectinload(Review.location_links).selectinload(LocationSeatOfReview.location)
+        select(
+            Review.id, Review.rate, Review.pollution_id, Review.condition_id, Review.material_id,
+            Review.seating_positions, Review.location_id, Review.author_id, Review.created_at,
+            func.coalesce(LocationSeat.name, "Локация удалена").label("location_name"),
+            # Автор - сам пользователь, его не подгружаем
+            literal(author.Username).label("author_username"),
+            LocationSeat.cord_x.label("location_cord_x"),
+            LocationSeat.cord_y.label("location_cord_y"),
         )
-        .where(Review.author_id == current_user.id)
-        .order_by(Review.created_at.desc())
+        .outerjoin(LocationSeat, LocationSeat.id == Review.location_id)
+        .where(Review.author_id == author.id)
+        .order_by(Review.created_at.desc(), Review.id.desc())
     )
-    result = await db.execute(stmt)
-    reviews = result.scalars().all()
-
-    for r in reviews:
-        if r.location_links:
-            r.location_id = r.location_links[0].locations_id
-            
-    return reviews
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor, datetime, int)
+        stmt = stmt.where(tuple_(Review.created_at, Review.id) < tuple_(last_created_at, last_id))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
 
 
 #вывести один обзор
@@ -137,7 +302,7 @@ async def get_review(
         select(Review)
         .options(
             selectinload(Review.author),
-            selectinload(Review.location_links).selectinload(LocationSeatOfReview.location)
+            selectinload(Review.location)
         )
         .where(Review.id == review_id)
     )
@@ -147,9 +312,6 @@ async def get_review(
     if not review:
         raise HTTPException(status_code=404, detail="Обзор не найден")
 
-    if review.location_links:
-        review.location_id = review.location_links[0].locations_id
-
     return review
 
 
@@ -166,7 +328,7 @@ async def update_review(
         select(Review)
         .options(
             selectinload(Review.author),
-            selectinload(Review.location_links).selectinload(LocationSeatOfReview.location)
+            selectinload(Review.location)
         )
         .where(Review.id == review_id)
     )
@@ -185,16 +347,21 @@ async def update_review(
 
     # Обновление полей
     update_data = review_update.model_dump(exclude_unset=True)
+    old_values = ratings.ReviewValues.of(review)
     
     for key, value in update_data.items():
         setattr(review, key, value)
 
+    # Агрегаты локации: убираем старые значения и учитываем новые
+    if review.location_id is not None:
+        await ratings.update_review(db, review.location_id, old_values, review)
+    await changes.record_change(db, changes.REVIEW, review.id, location_id=review.location_id)
+
     await db.commit()
     # refresh тут не нужен, так как объект в памяти уже обновлен, 
     # а refresh может сбросить подгруженные связи (author/location)
-
-    if review.location_links:
-        review.location_id = review.location_links[0].locations_id
+    if review.location is not None:
+        await bbox_cache.invalidate_point(review.location.cord_x, review.location.cord_y)
 
     return review
 
@@ -217,8 +384,15 @@ async def delete_review(
     if not (is_author or is_admin):
         raise HTTPException(status_code=403, detail="У вас нет прав для удаления этого обзора")
 
+    location_id = review.location_id
+    if location_id is not None:
+        await ratings.remove_review(db, location_id, review)
+    await changes.record_change(db, changes.REVIEW, review_id, changes.DELETE, location_id=location_id)
+
     await db.delete(review)
     await db.commit()
+    if location_id is not None:
+        await bbox_cache.invalidate_location(db, location_id)
 
     return None
 
@@ -0,0 +1,110 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app import changes
+from app.database import get_db
+from app.map.models import User, ChangeLog, LocationSeat, Review, Picture
+from app.pyd import schemas
+from app.routers.locations import visibility_clause
+from app.security import get_current_user_or_none
+
+sync_router = APIRouter(prefix="/sync", tags=["Sync"])
+
+# Токен - последний отданный id журнала. Записи журнала пишутся под
+# changes.lock_change_log, поэтому видимые id - всегда закоммиченный префикс
+# и запись с меньшим id не может появиться после выдачи токена.
+
+
+# изменения с момента токена (для офлайн-кэша приложения)
+@sync_router.get("/changes", response_model=schemas.SyncChanges)
+async def get_changes(
+    since: int = Query(0, ge=0, description="Токен из прошлого ответа (0 - полная выгрузка)"),
+    limit: int = Query(1000, ge=1, le=5000),
+    current_user: Optional[User] = Depends(get_current_user_or_none),
+    db: AsyncSession = Depends(get_db)
+):
+    stmt = (
+        select(ChangeLog)
+        .where(ChangeLog.id > since)
+        .order_by(ChangeLog.id)
+        .limit(limit)
+    )
+    log = (await db.execute(stmt)).scalars().all()
+
+    # Схлопываем: по каждой сущности важна только последняя операция
+    latest = {}
+    for entry in log:
+        latest[(entry.entity, entry.entity_id)] = entry.operation
+
+    def ids(entity: str, operation: str) -> set:
+        return {eid for (e, eid), op in latest.items() if e == entity and op == operation}
+
+    deleted = {
+        changes.LOCATION: ids(changes.LOCATION, changes.DELETE),
+        changes.REVIEW: ids(changes.REVIEW, changes.DELETE),
+        changes.PICTURE: ids(changes.PICTURE, changes.DELETE),
+    }
+
+    # Скрытые локации (и их отзывы и фото) отдаём как удалённые - правило карточки локации
+    visible = await visibility_clause(db, current_user)
+
+    # --- Локации ---
+    locations = []
+    location_ids = ids(changes.LOCATION, changes.UPSERT)
+    if location_ids:
+        stmt = (
+            select(LocationSeat)
+            .options(selectinload(LocationSeat.rating))
+            .where(LocationSeat.id.in_(location_ids))
+        )
+        if visible is not None:
+            stmt = stmt.where(visible)
+        locations = (await db.execute(stmt)).scalars().all()
+    deleted[changes.LOCATION].update(location_ids - {l.id for l in locations})
+
+    # --- Отзывы ---
+    reviews = []
+    review_ids = ids(changes.REVIEW, changes.UPSERT)
+    if review_ids:
+        stmt = (
+            select(Review)
+            .options(
+                selectinload(Review.author),
+                selectinload(Review.location)
+            )
+            .where(Review.id.in_(review_ids))
+        )
+        if visible is not None:
+            # Отзыв удалённой локации (location_id = NULL) остаётся видимым
+            stmt = stmt.outerjoin(LocationSeat, LocationSeat.id == Review.location_id).where(
+                or_(Review.location_id.is_(None), visible)
+            )
+        reviews = (await db.execute(stmt)).scalars().all()
+    deleted[changes.REVIEW].update(review_ids - {r.id for r in reviews})
+
+    # --- Фото ---
+    pictures = []
+    picture_ids = ids(changes.PICTURE, changes.UPSERT)
+    if picture_ids:
+        stmt = select(Picture).where(Picture.id.in_(picture_ids))
+        if visible is not None:
+            stmt = stmt.join(LocationSeat, LocationSeat.id == Picture.location_id).where(visible)
+        pictures = (await db.execute(stmt)).scalars().all()
+    deleted[changes.PICTURE].update(picture_ids - {p.id for p in pictures})
+
+    return {
+        "token": log[-1].id if log else since,
+        "has_more": len(log) == limit,
+        "locations": locations,
+        "reviews": reviews,
+        "pictures": pictures,
+        "deleted": {
+            "locations": sorted(deleted[changes.LOCATION]),
+            "reviews": sorted(deleted[changes.REVIEW]),
+            "pictures": sorted(deleted[changes.PICTURE]),
+        },
+    }
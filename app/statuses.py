@@ -0,0 +1,33 @@
+from typing import Optional, FrozenSet
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.map.models import Status
+from app.registry import TtlRegistry, DEFAULT_TTL
+
+STATUS_CACHE_TTL = DEFAULT_TTL
+
+
+async def _load_public_ids(db: AsyncSession) -> FrozenSet[int]:
+    result = await db.execute(select(Status.id).where(Status.is_public.is_(True)))
+    return frozenset(result.scalars().all())
+
+
+class StatusRegistry(TtlRegistry[FrozenSet[int]]):
+    """
+    Кэш публичных статусов (Status.is_public) в памяти процесса.
+    Вместо join на Statuses в каждом запросе фильтруем LocationSeat.status по id.
+    """
+
+    def __init__(self, ttl: float = STATUS_CACHE_TTL):
+        super().__init__(_load_public_ids, ttl)
+
+    async def public_ids(self, db: AsyncSession) -> FrozenSet[int]:
+        return await self.get(db)
+
+    async def is_public(self, db: AsyncSession, status_id: Optional[int]) -> bool:
+        return status_id in await self.public_ids(db)
+
+
+status_registry = StatusRegistry()
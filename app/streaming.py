@@ -0,0 +1,56 @@
+from typing import AsyncIterator, Callable, Optional, Type
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.database import async_session_maker
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Сколько строк читаем с серверного курсора за раз
+STREAM_BATCH = 500
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def stream_partitions(query, scalars: bool = True, batch: int = STREAM_BATCH) -> AsyncIterator[list]:
+    """
+    Читаем query серверным курсором пачками по batch строк.
+    Сессия своя: она должна жить, пока отдаётся ответ. После каждой пачки
+    объекты выкидываются из сессии, так что память не растёт с размером выборки.
+    """
+    async with async_session_maker() as session:
+        result = await session.stream(query.execution_options(yield_per=batch))
+        source = result.scalars() if scalars else result.mappings()
+        async for partition in source.partitions(batch):
+            yield partition
+            session.expunge_all()
+
+
+async def ndjson_rows(
+    query,
+    model: Type[BaseModel],
+    scalars: bool = True,
+    prepare: Optional[Callable] = None,
+    batch: int = STREAM_BATCH
+) -> AsyncIterator[bytes]:
+    """
+    NDJSON из query (см. stream_partitions).
+    prepare - доработка строки перед сериализацией (например, проставить location_id).
+    """
+    async for partition in stream_partitions(query, scalars, batch):
+        chunk = []
+        for row in partition:
+            if not scalars:
+                row = dict(row)
+            if prepare is not None:
+                row = prepare(row)
+            chunk.append(model.model_validate(row).model_dump_json())
+        yield ("\n".join(chunk) + "\n").encode()
+
+
+def ndjson_response(rows: AsyncIterator[bytes], headers: dict = None) -> StreamingResponse:
+    return StreamingResponse(rows, media_type=NDJSON_MEDIA_TYPE, headers=headers)
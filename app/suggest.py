@@ -0,0 +1,180 @@
+"""
+Подсказки для строки поиска (GET /locations/suggest) без запросов к БД.
+
+Слова названий и адресов лежат в отсортированном массиве (рядом - id локации);
+все слова с данным префиксом - это непрерывный отрезок, который находится
+двумя bisect. Индекс живёт в памяти процесса, строится при
+старте и обновляется роутерами после commit, а изменения из других воркеров
+догоняет app/index_sync.py. Память ограничена MAX_ENTRIES.
+"""
+import heapq
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.map.models import LocationSeat
+
+# Слова короче не индексируем ("д", "у")
+MIN_TOKEN_LENGTH = 2
+# Больше слов с одной локации не берём (длинные адреса и названия)
+MAX_TOKENS_PER_LOCATION = 12
+# Потолок размера массива: дальше новые слова не добавляются
+MAX_ENTRIES = 1_000_000
+# Сколько слов максимум просматриваем на один запрос (короткий префикс вроде "п")
+MAX_SCAN = 2000
+
+NAME, ADDRESS = 0, 1
+
+_END = "\U0010ffff"
+
+
+def tokenize(text: str) -> List[str]:
+    text = (text or "").lower().replace("ё", "е")
+    return re.findall(r"\w+", text)
+
+
+class SuggestIndex:
+    """
+    Два параллельных массива, отсортированных по паре (слово, ключ): слова (интернированные
+    строки) и ключи id * 2 + поле (0 - название, 1 - адрес) в array - ~16 байт на слово.
+    Позиция конкретной пары находится bisect-ом, так что удаление и вставка
+    не просматривают все локации с тем же словом.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._words: List[str] = []
+        self._keys = array("q")
+        # id -> (название, адрес, статус, пары (слово, поле))
+        self._docs: Dict[int, Tuple[str, str, int, Tuple[Tuple[str, int], ...]]] = {}
+        self.truncated = False
+
+    def __len__(self):
+        return len(self._docs)
+
+    @property
+    def size(self) -> int:
+        return len(self._words)
+
+    @staticmethod
+    def _tokens(name: str, address: str) -> Tuple[Tuple[str, int], ...]:
+        tokens = {}
+        for field, text in ((NAME, name), (ADDRESS, address)):
+            for token in tokenize(text):
+                if len(token) >= MIN_TOKEN_LENGTH and token not in tokens:
+                    tokens[sys.intern(token)] = field
+        return tuple(tokens.items())[:MAX_TOKENS_PER_LOCATION]
+
+    def _position(self, token: str, key: int) -> int:
+        """Место пары (слово, ключ) в массивах: ключи одного слова тоже отсортированы"""
+        lo = bisect_left(self._words, token)
+        hi = bisect_right(self._words, token, lo)
+        return bisect_left(self._keys, key, lo, hi)
+
+    def _insert_tokens(self, location_id: int, tokens):
+        for token, field in tokens:
+            key = location_id * 2 + field
+            i = self._position(token, key)
+            self._words.insert(i, token)
+            self._keys.insert(i, key)
+
+    def _remove_tokens(self, location_id: int, tokens):
+        for token, field in tokens:
+            key = location_id * 2 + field
+            i = self._position(token, key)
+            if i < len(self._words) and self._words[i] == token and self._keys[i] == key:
+                del self._words[i]
+                del self._keys[i]
+
+    def add(self, location_id: int, name: str, address: str, status: int):
+        tokens = self._tokens(name, address)
+        old = self._docs.get(location_id)
+        old_tokens = old[3] if old is not None else ()
+        if tokens != old_tokens:
+            # Места нет - оставляем прежние слова локации, а не выкидываем её из подсказок
+            if len(self._words) - len(old_tokens) + len(tokens) > self.max_entries:
+                self.truncated = True
+                return
+            self._remove_tokens(location_id, old_tokens)
+            self._insert_tokens(location_id, tokens)
+        self._docs[location_id] = (name, address, status, tokens)
+
+    def remove(self, location_id: int):
+        doc = self._docs.pop(location_id, None)
+        if doc is not None:
+            self._remove_tokens(location_id, doc[3])
+
+    def upsert(self, location: LocationSeat):
+        self.add(location.id, location.name, location.address, location.status)
+
+    def clear(self):
+        self._words = []
+        self._keys = array("q")
+        self._docs.clear()
+        self.truncated = False
+
+    def load(self, rows: Iterable[Tuple[int, str, str, int]]):
+        """Сборка с нуля из (id, название, адрес, статус): пары сортируются один раз"""
+        self.clear()
+        pairs = []
+        for location_id, name, address, status in rows:
+            tokens = self._tokens(name, address)
+            if len(pairs) + len(tokens) > self.max_entries:
+                self.truncated = True
+                break
+            self._docs[location_id] = (name, address, status, tokens)
+            pairs.extend((token, location_id * 2 + field) for token, field in tokens)
+        pairs.sort()
+        self._words = [token for token, _ in pairs]
+        self._keys = array("q", (key for _, key in pairs))
+
+    async def rebuild(self, db: AsyncSession):
+        """Полная пересборка из LocationSeat (при старте приложения)"""
+        stmt = select(
+            LocationSeat.id, LocationSeat.name, LocationSeat.address, LocationSeat.status
+        ).execution_options(yield_per=5000)
+        result = await db.stream(stmt)
+        self.load([tuple(row) async for row in result])
+
+    def suggest(self, prefix: str, limit: int = 10, statuses: Optional[FrozenSet[int]] = None) -> List[dict]:
+        """
+        Локации, у которых каждое слово запроса - начало какого-то их слова.
+        Ищем по самому длинному слову запроса, остальные проверяем по словам локации.
+        Сначала совпадения по названию, потом по адресу, короткие названия выше.
+        """
+        words = tokenize(prefix)
+        if not words:
+            return []
+        words.sort(key=len, reverse=True)
+        lead, rest = words[0], words[1:]
+
+        lo = bisect_left(self._words, lead)
+        hi = min(bisect_left(self._words, lead + _END, lo), lo + MAX_SCAN)
+
+        best: Dict[int, int] = {}
+        for key in self._keys[lo:hi]:
+            location_id, field = key >> 1, key & 1
+            if best.get(location_id, ADDRESS + 1) > field:
+                best[location_id] = field
+
+        found = []
+        for location_id, field in best.items():
+            name, address, status, tokens = self._docs[location_id]
+            if statuses is not None and status not in statuses:
+                continue
+            if rest and not all(any(t.startswith(w) for t, _ in tokens) for w in rest):
+                continue
+            found.append((field, len(name), name, location_id, address))
+
+        return [
+            {"id": location_id, "name": name, "address": address}
+            for _, _, name, location_id, address in heapq.nsmallest(limit, found)
+        ]
+
+
+suggest_index = SuggestIndex()
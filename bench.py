@@ -0,0 +1,388 @@
+"""
+Бенчмарки запросов к базе.
+
+Нужна заполненная справочниками база (python seed.py).
+Служебные локации создаются с префиксом имени "bench:" и удаляются в конце.
+
+    python bench.py bbox --sizes 10000 100000 1000000
+    python bench.py pins --size 20000 --reviews 3
+    python bench.py formats --sizes 1000 10000 100000   (база не нужна)
+    python bench.py suggest --sizes 10000 100000 1000000 (база не нужна)
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+
+from sqlalchemy import select, insert, delete, text, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from app import geo, packed
+from app.suggest import SuggestIndex
+from app.database import async_session_maker
+from app.map.models import (
+    LocationSeat, Status, TypeOfSeat, User, Review,
+    Pollution, Condition, Material
+)
+from app.pyd.schemas import LocationSeatResponse, LocationPin
+from app.ratings import rebuild_all as rebuild_ratings
+from app.routers.locations import get_locations, get_location_pins
+from app.fieldsets import DEFAULT_VIEW
+from app.cache import bbox_cache
+
+BENCH_PREFIX = "bench:"
+
+# Центр и разброс генерируемых точек (~ область вокруг Нижнего Тагила)
+CENTER_LAT = 57.9194
+CENTER_LON = 59.9650
+SPREAD_LAT = 1.0
+SPREAD_LON = 1.5
+
+# Размер "экрана" карты в градусах (~ 2 x 2 км)
+VIEWPORT_LAT = 0.02
+VIEWPORT_LON = 0.03
+
+INSERT_BATCH = 5000
+
+
+def random_point():
+    lat = CENTER_LAT + random.uniform(-SPREAD_LAT, SPREAD_LAT)
+    lon = CENTER_LON + random.uniform(-SPREAD_LON, SPREAD_LON)
+    return lat, lon
+
+
+def random_viewport():
+    lat, lon = random_point()
+    return (
+        Decimal(str(lat)), Decimal(str(lat + VIEWPORT_LAT)),
+        Decimal(str(lon)), Decimal(str(lon + VIEWPORT_LON)),
+    )
+
+
+def report(title: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"   {title:<28} median {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+async def bench_count(session: AsyncSession) -> int:
+    stmt = select(func.count(LocationSeat.id)).where(LocationSeat.name.like(f"{BENCH_PREFIX}%"))
+    return (await session.execute(stmt)).scalar_one()
+
+
+async def seed_bench_locations(session: AsyncSession, count: int):
+    """Быстрая вставка count служебных локаций многострочными INSERT"""
+    type_id = (await session.execute(select(TypeOfSeat.id))).scalars().first()
+    status_id = (await session.execute(
+        select(Status.id).where(Status.is_public.is_(True))
+    )).scalars().first()
+    author_id = (await session.execute(select(User.id))).scalars().first()
+    if not all([type_id, status_id, author_id]):
+        raise SystemExit("❌ Сначала заполните базу: python seed.py")
+
+    done = 0
+    while done < count:
+        rows = []
+        for _ in range(min(INSERT_BATCH, count - done)):
+            lat, lon = random_point()
+            rows.append({
+                "name": f"{BENCH_PREFIX}{done + len(rows)}",
+                "description": "bench",
+                "address": "bench",
+                "type": type_id,
+                "status": status_id,
+                "author_id": author_id,
+                "cord_x": Decimal(str(lat)),
+                "cord_y": Decimal(str(lon)),
+                # Массовая вставка обходит ORM-события, geohash считаем сами
+                "geohash": geo.encode(lat, lon),
+            })
+        await session.execute(insert(LocationSeat), rows)
+        await session.commit()
+        done += len(rows)
+
+
+async def seed_bench_reviews(session: AsyncSession, per_location: int):
+    """По per_location отзывов на каждую служебную локацию"""
+    author_id = (await session.execute(select(User.id))).scalars().first()
+    pollution_id = (await session.execute(select(Pollution.id))).scalars().first()
+    condition_id = (await session.execute(select(Condition.id))).scalars().first()
+    material_id = (await session.execute(select(Material.id))).scalars().first()
+
+    location_ids = (await session.execute(
+        select(LocationSeat.id).where(LocationSeat.name.like(f"{BENCH_PREFIX}%"))
+    )).scalars().all()
+
+    for start in range(0, len(location_ids), INSERT_BATCH):
+        batch = location_ids[start:start + INSERT_BATCH]
+        rows = [
+            {
+                "rate": random.randint(1, 5),
+                "author_id": author_id,
+                "created_at": datetime.utcnow(),
+                "pollution_id": pollution_id,
+                "condition_id": condition_id,
+                "material_id": material_id,
+                "seating_positions": random.randint(2, 6),
+                "location_id": location_id,
+            }
+            for location_id in batch for _ in range(per_location)
+        ]
+        await session.execute(insert(Review), rows)
+        await session.commit()
+
+
+async def cleanup(session: AsyncSession):
+    bench_locations = select(LocationSeat.id).where(LocationSeat.name.like(f"{BENCH_PREFIX}%"))
+    bench_reviews = select(Review.id).where(Review.location_id.in_(bench_locations))
+    while True:
+        review_ids = (await session.execute(bench_reviews.limit(INSERT_BATCH))).scalars().all()
+        if not review_ids:
+            break
+        await session.execute(delete(Review).where(Review.id.in_(review_ids)))
+    await session.execute(delete(LocationSeat).where(LocationSeat.name.like(f"{BENCH_PREFIX}%")))
+    await session.commit()
+
+
+async def timed(session: AsyncSession, stmt) -> float:
+    start = time.perf_counter()
+    (await session.execute(stmt)).all()
+    return (time.perf_counter() - start) * 1000
+
+
+# --- BBOX ---
+
+def bbox_plain(min_lat, max_lat, min_lon, max_lon):
+    return select(LocationSeat.id).where(
+        LocationSeat.cord_x >= min_lat,
+        LocationSeat.cord_x <= max_lat,
+        LocationSeat.cord_y >= min_lon,
+        LocationSeat.cord_y <= max_lon,
+    )
+
+
+def bbox_geohash(min_lat, max_lat, min_lon, max_lon):
+    return bbox_plain(min_lat, max_lat, min_lon, max_lon).where(
+        geo.bbox_clause(LocationSeat.geohash, min_lat, max_lat, min_lon, max_lon)
+    )
+
+
+async def run_bbox(sizes, queries: int):
+    async with async_session_maker() as session:
+        try:
+            for size in sizes:
+                existing = await bench_count(session)
+                if existing < size:
+                    print(f"\n📍 Досеиваем {size - existing} локаций...")
+                    await seed_bench_locations(session, size - existing)
+                await session.execute(text('ANALYZE "Location_seats"'))
+                await session.commit()
+
+                viewports = [random_viewport() for _ in range(queries)]
+                plain = [await timed(session, bbox_plain(*v)) for v in viewports]
+                cells = [await timed(session, bbox_geohash(*v)) for v in viewports]
+
+                print(f"\n📊 {size} локаций, {queries} запросов bbox:")
+                report("диапазоны cord_x/cord_y", plain)
+                report("ячейки geohash + точный", cells)
+        finally:
+            print("\n🧹 Удаляем служебные локации...")
+            await cleanup(session)
+
+
+# --- PINS ---
+
+async def measure(session: AsyncSession, call):
+    """Время (мс) и пик памяти (МБ) запроса вместе с сериализацией ответа"""
+    session.expunge_all()
+    tracemalloc.start()
+    start = time.perf_counter()
+    payload = await call()
+    elapsed = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, len(payload)
+
+
+async def run_pins(size: int, reviews: int, queries: int):
+    full_adapter = TypeAdapter(List[LocationSeatResponse])
+    pins_adapter = TypeAdapter(List[LocationPin])
+    viewport = dict(
+        min_lat=Decimal(str(CENTER_LAT - 0.2)), max_lat=Decimal(str(CENTER_LAT + 0.2)),
+        min_lon=Decimal(str(CENTER_LON - 0.3)), max_lon=Decimal(str(CENTER_LON + 0.3)),
+        type_id=None, status_id=None, current_user=None,
+    )
+
+    # Меряем запросы в БД, а не кэш окон карты
+    bbox_cache.enabled = False
+
+    async def full():
+        rows = await get_locations(
+            **viewport, limit=None, cursor=None, view=DEFAULT_VIEW,
+            request=Request({"type": "http", "headers": []}), response=Response(), db=session
+        )
+        return full_adapter.dump_json(rows)
+
+    async def pins():
+        rows = await get_location_pins(**viewport, request=Request({"type": "http", "headers": []}), db=session)
+        return pins_adapter.dump_json(rows)
+
+    async with async_session_maker() as session:
+        try:
+            print(f"\n📍 Сеем {size} локаций и по {reviews} отзыва...")
+            await seed_bench_locations(session, size)
+            await seed_bench_reviews(session, reviews)
+            await rebuild_ratings(session)
+            await session.execute(text('ANALYZE'))
+            await session.commit()
+
+            for title, call in (("GET /locations/", full), ("GET /locations/pins", pins)):
+                runs = [await measure(session, call) for _ in range(queries)]
+                timings = [r[0] for r in runs]
+                print(f"\n📊 {title}: {runs[0][2] / 1024:.1f} КБ ответа, пик памяти {max(r[1] for r in runs):.1f} МБ")
+                report("время с сериализацией", timings)
+        finally:
+            print("\n🧹 Удаляем служебные данные...")
+            await cleanup(session)
+
+
+# --- FORMATS ---
+
+def synthetic_pins(count: int) -> List[dict]:
+    pins = []
+    for i in range(count):
+        lat, lon = random_point()
+        pins.append({
+            "id": i + 1,
+            "name": f"Скамейка на улице номер {i}",
+            "cord_x": Decimal(str(lat)),
+            "cord_y": Decimal(str(lon)),
+            "type": random.randint(1, 2),
+            "status": random.randint(1, 3),
+            "avg_rate": random.choice([None, round(random.uniform(1, 5), 2)]),
+            "review_count": random.randint(0, 20),
+        })
+    return pins
+
+
+def timed_call(call, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def run_formats(sizes):
+    full_adapter = TypeAdapter(List[LocationSeatResponse])
+    pins_adapter = TypeAdapter(List[LocationPin])
+
+    for size in sizes:
+        pins = synthetic_pins(size)
+        # Текущий ответ GET /locations/ для тех же точек (даже без отзывов и фото)
+        full = [
+            {**p, "description": "Описание", "address": "Адрес", "author_id": 1,
+             "reviews": [], "pictures": [], "rating": None}
+            for p in pins
+        ]
+        variants = {
+            "GET /locations/ (JSON)": full_adapter.dump_json(full_adapter.validate_python(full)),
+            "GET /locations/pins (JSON)": pins_adapter.dump_json(pins_adapter.validate_python(pins)),
+            "pins (msgpack колонками)": packed.pack_pins(pins),
+        }
+        decoders = {
+            "GET /locations/ (JSON)": json.loads,
+            "GET /locations/pins (JSON)": json.loads,
+            "pins (msgpack колонками)": packed.unpack_pins,
+        }
+
+        print(f"\n📊 {size} маркеров:")
+        for title, body in variants.items():
+            decode_ms = timed_call(lambda: decoders[title](body))
+            print(
+                f"   {title:<28} {len(body) / 1024:9.1f} КБ   "
+                f"gzip {len(gzip.compress(body)) / 1024:8.1f} КБ   "
+                f"разбор {decode_ms:8.2f} ms"
+            )
+
+
+# --- SUGGEST ---
+
+NAME_WORDS = ["Скамейка", "Лавочка", "Беседка", "у", "фонтана", "пруда", "школы", "парка", "сквера", "вокзала", "театра", "набережной"]
+STREETS = ["Ленина", "Мира", "Победы", "Садовая", "Лесная", "Космонавтов", "Пушкина", "Гагарина", "Октябрьская", "Строителей"]
+
+
+def synthetic_names(count: int):
+    for i in range(count):
+        name = " ".join(random.sample(NAME_WORDS, 3)) + f" {i}"
+        address = f"ул. {random.choice(STREETS)}, {random.randint(1, 200)}"
+        yield i + 1, name, address
+
+
+def run_suggest(sizes, queries: int):
+    words = [w.lower() for w in NAME_WORDS + STREETS if len(w) > 1]
+    prefixes = [w[:random.randint(1, len(w))] for w in random.choices(words, k=queries)]
+    # Часть запросов из двух слов: "скам лен"
+    prefixes += [f"{a[:4]} {b[:3]}" for a, b in zip(random.choices(words, k=queries // 4), random.choices(words, k=queries // 4))]
+
+    for size in sizes:
+        index = SuggestIndex()
+        rows = [(location_id, name, address, 1) for location_id, name, address in synthetic_names(size)]
+        start = time.perf_counter()
+        index.load(rows)
+        build_s = time.perf_counter() - start
+
+        timings = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            index.suggest(prefix, 10)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        print(f"\n📊 {size} локаций: {index.size} слов, сборка {build_s:.2f} с")
+        report("suggest", timings)
+        print(f"   {'запросов в секунду':<28} {len(timings) / (sum(timings) / 1000):,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки banches_backend")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    bbox = sub.add_parser("bbox", help="Задержка запроса по bbox")
+    bbox.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    bbox.add_argument("--queries", type=int, default=200)
+
+    pins = sub.add_parser("pins", help="GET /locations/ против GET /locations/pins")
+    pins.add_argument("--size", type=int, default=20_000)
+    pins.add_argument("--reviews", type=int, default=3, help="Отзывов на локацию")
+    pins.add_argument("--queries", type=int, default=10)
+
+    formats = sub.add_parser("formats", help="Размер и скорость разбора JSON против msgpack")
+    formats.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+
+    suggest = sub.add_parser("suggest", help="Скорость подсказок по префиксу (в памяти)")
+    suggest.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    suggest.add_argument("--queries", type=int, default=2000)
+
+    args = parser.parse_args()
+    if args.bench == "bbox":
+        asyncio.run(run_bbox(sorted(args.sizes), args.queries))
+    elif args.bench == "pins":
+        asyncio.run(run_pins(args.size, args.reviews, args.queries))
+    elif args.bench == "formats":
+        run_formats(args.sizes)
+    elif args.bench == "suggest":
+        run_suggest(args.sizes, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,10 @@ async def clean_database():
         # ВАЖНО: Используй точные названия таблиц из БД (обычно они совпадают с __tablename__)
         # CASCADE удалит зависимые данные (например, удаляя User, удалит и его Review)
         tables = [
-            "Location_seats_of_Reviews", # Связи удаляем первыми (или вместе с остальными)
+            # Location_seats_of_Reviews теперь VIEW поверх Reviews - его не чистим
+            "Location_ratings",
+            "Location_review_stats",
+            "Change_log",
             "Pictures",
             "Reviews",
             "Location_seats",
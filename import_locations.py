@@ -0,0 +1,56 @@
+"""
+Массовый импорт локаций из файла (то же, что POST /locations/import).
+
+    python import_locations.py benches.csv
+    python import_locations.py benches.geojson --default-status "Активно" --author admin@admin.com
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from app.database import async_session_maker
+from app.importer import LocationImporter, ImportFormatError, detect_format, read_records, FORMATS
+from app.map.models import User
+
+
+async def import_locations(path: str, fmt: str, author_email: str, default_status: str):
+    print(f"📥 Импорт локаций из {path}...")
+
+    async with async_session_maker() as session:
+        author = (await session.execute(select(User).where(User.email == author_email))).scalar_one_or_none()
+        if author is None:
+            raise SystemExit(f"❌ Пользователь {author_email} не найден (сначала python seed.py)")
+
+        with open(path, encoding="utf-8-sig", newline="") as fp:
+            job = LocationImporter(session, author.id, default_status=default_status)
+            report = await job.run(read_records(fp, fmt))
+
+    for error in report["errors"]:
+        print(f"   строка {error['row']}: {error['error']}")
+    if report["aborted"]:
+        print(f"❌ Импорт прерван: {report['aborted']}")
+    print(
+        f"✅ Всего {report['total']}, добавлено {report['inserted']}, "
+        f"дубликатов {report['duplicates']}, с ошибками {report['failed']} "
+        f"за {report['seconds']} с ({report['rows_per_sec']} строк/с)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт локаций из CSV / GeoJSON")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="По умолчанию - по расширению файла")
+    parser.add_argument("--author", default="admin@admin.com", help="email автора импортируемых локаций")
+    parser.add_argument("--default-status", help="Статус (id или название) для строк без статуса")
+    args = parser.parse_args()
+
+    try:
+        fmt = args.format or detect_format(args.path)
+    except ImportFormatError as e:
+        raise SystemExit(f"❌ {e}")
+    asyncio.run(import_locations(args.path, fmt, args.author, args.default_status))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import asyncio
+from app.database import async_session_maker
+from app.ratings import rebuild_all
+
+
+async def rebuild_ratings():
+    print("🔄 Пересборка агрегатов отзывов (Location_ratings, Location_review_stats)...")
+
+    async with async_session_maker() as session:
+        try:
+            await rebuild_all(session)
+            print("✅ Агрегаты пересобраны.")
+        except Exception as e:
+            print(f"❌ Ошибка при пересборке: {e}")
+            await session.rollback()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_ratings())
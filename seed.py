@@ -9,9 +9,10 @@ from sqlalchemy import select
 from app.database import async_session_maker
 from app.map.models import (
     User, Role, Status, TypeOfSeat, Material, 
-    Condition, Pollution, LocationSeat, Review, LocationSeatOfReview
+    Condition, Pollution, LocationSeat, Review
 )
 from app.security import get_password_hash
+from app.ratings import rebuild_all as rebuild_ratings
 
 fake = Faker("ru_RU")
 
@@ -20,6 +21,7 @@ fake = Faker("ru_RU")
 ROLES_DATA = ["admin", "user"]
 
 STATUSES_DATA = ["Активно", "На ремонте", "Временно недоступно"]
+PUBLIC_STATUSES_DATA = ["Активно", "На ремонте"]
 SEAT_TYPE_NAMES = ["Лавочка", "Беседка"]
 MATERIALS_DATA = ["Дерево", "Металл", "Бетон", "Пластик", "Комбинированный", "Камень"]
 CONDITIONS_DATA = ["Идеальное", "Хорошее", "Удовлетворительное", "Плохое", "Аварийное"]
@@ -53,6 +55,16 @@ async def seed_simple_dict(session: AsyncSession, model, data_list, dict_name):
             session.add(model(name=name))
     await session.commit()
 
+async def seed_statuses(session: AsyncSession):
+    """Статусы; is_public ставим только новым - флаги, изменённые в админке, не трогаем"""
+    print("--- Сидинг Статусы ---")
+    existing = set((await session.execute(select(Status.name))).scalars().all())
+
+    for name in STATUSES_DATA:
+        if name not in existing:
+            session.add(Status(name=name, is_public=name in PUBLIC_STATUSES_DATA))
+    await session.commit()
+
 async def seed_default_users(session: AsyncSession):
     print("--- Сидинг дефолтных пользователей ---")
     admin_role = (await session.execute(select(Role).where(Role.role_name == "admin"))).scalar_one_or_none()
@@ -154,20 +166,17 @@ async def seed_random_content(session: AsyncSession, users_count=10, locations_c
             condition_id=random.choice(conditions).id,
             material_id=random.choice(materials).id,
             seating_positions=random.randint(2, 6),
+            # Отзыв ссылается на локацию напрямую
+            location_id=target_location.id,
             author_id=author.id,
             created_at=datetime.utcnow()
         )
         session.add(review)
-        await session.flush() # Получаем ID отзыва
-
-        # Связываем отзыв и локацию (Many-to-Many)
-        link = LocationSeatOfReview(
-            locations_id=target_location.id,
-            reviews_id=review.id
-        )
-        session.add(link)
 
     await session.commit()
+
+    # Отзывы вставлялись напрямую - пересобираем агрегаты локаций
+    await rebuild_ratings(session)
     print("✅ Рандомные данные успешно сгенерированы!")
 
 
@@ -181,7 +190,7 @@ async def main():
         await seed_roles(session)
         await seed_default_users(session)
         
-        await seed_simple_dict(session, Status, STATUSES_DATA, "Статусы")
+        await seed_statuses(session)
         await seed_simple_dict(session, TypeOfSeat, SEAT_TYPE_NAMES, "Типы мест")
         await seed_simple_dict(session, Material, MATERIALS_DATA, "Материалы")
         await seed_simple_dict(session, Condition, CONDITIONS_DATA, "Состояния")